@@ -19,5 +19,6 @@ from .mapping import MappingMiddleware
 # import front-end utilities
 from .plot import Plotter
 from .pose import PoseMiddleware
+from .recording import ResponseRecorder, ResponseReplayer
 # import worker
 from .worker import Worker
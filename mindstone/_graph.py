@@ -20,28 +20,105 @@ A node a is connected to another node b if
     b in ga
 
 Note that, in this case, the order the set gi are listed in, identifies them.
+
+Indexed graphs:
+~~~~~~~~~~~~~~~
+An indexed graph (see `IndexedGraph`) is a graph as described above that also keeps an index of the in-neighbors
+and a topological order of its nodes. The functions in this module keep that index up to date and use it, so that
+in-degrees and removing nodes don't require searching the whole graph, and so that the graph is only checked for
+cycles again once it changed. An indexed graph should only be changed using the functions in this module.
+
+CSR snapshots:
+~~~~~~~~~~~~~~
+A graph that is mostly read can be frozen into a compressed sparse row (CSR) snapshot (see `to_csr`), where the
+nodes are numbered and the children of node i are
+    indices[indptr[i]:indptr[i + 1]]
+The csr functions in this module work on the arrays of a snapshot with NumPy instead of traversing the sets.
 """
 
 import warnings
-from collections import Hashable, Iterable
+from collections.abc import Hashable, Iterable
+from itertools import chain
+from typing import Dict, Iterator, List, NamedTuple, Union
+
+import numpy as np
+
+
+class IndexedGraph(dict):
+    """ Indexed graph.
+
+    Besides the children of its nodes, an indexed graph keeps the parents of its nodes and the position of each node
+    in a topological order of the graph. The order is computed when it is needed and kept for as long as the graph
+    changes in ways that can't invalidate it (adding nodes, removing nodes and edges, and adding edges that follow
+    the order). Adding an edge that goes against the order discards it, so that building a graph never has to
+    reorder its nodes.
+    """
+
+    def __init__(self):
+        super().__init__()
+        # lists are used instead of sets as they are a lot smaller, and removing from them is proportional to the
+        # degree of a node either way.
+        self._in_neighbors: Dict[Hashable, list] = {}
+        # the position of each node in a topological order of the graph, or None if the order is out of date (or the
+        # graph has cycles)
+        self._order: Union[Dict[Hashable, int], None] = {}
+        self._next_position = 0
+
+
+class CSRGraph(NamedTuple):
+    # the key of each node, where the position of a key is the id of the node
+    keys: List[Hashable]
+    ids: Dict[Hashable, int]
+    indptr: np.ndarray
+    indices: np.ndarray
+
+    def to_keys(self, ids: Iterable[int]) -> list:
+        return [self.keys[i] for i in ids]
 
 
 def add_node(graph: dict, key: Hashable, container: set = None) -> None:
-    graph[key] = set() if container is None else container
+    container = set() if container is None else container
+    if not isinstance(graph, IndexedGraph):
+        graph[key] = container
+        return
+    if key in graph:
+        # the edges of the replaced container are replaced by the edges of the new container
+        for child in graph[key]:
+            _unindex_edge(graph, key, child)
+    else:
+        _index_node(graph, key)
+    graph[key] = container
+    for child in container:
+        _index_edge(graph, key, child)
 
 
 def remove_node(graph: dict, key: Hashable) -> None:
-    if key in graph:
+    if key not in graph:
+        return
+    if not isinstance(graph, IndexedGraph):
         del graph[key]
         # remove inbound connections to the node from other nodes in the graph
         for node_key in graph.keys():
             if key in graph[node_key]:
                 graph[node_key].remove(key)
+        return
+    for child in graph[key]:
+        _unindex_edge(graph, key, child)
+    for parent in graph._in_neighbors[key]:
+        graph[parent].remove(key)
+    del graph[key], graph._in_neighbors[key]
+    if graph._order is not None:
+        del graph._order[key]
 
 
 def add_edge(graph: dict, from_key: Hashable, to_key: Hashable) -> None:
     if from_key == to_key:
         raise ValueError("A node cannot be connected to itself")
+    if isinstance(graph, IndexedGraph):
+        if to_key not in graph[from_key]:
+            graph[from_key].add(to_key)
+            _index_edge(graph, from_key, to_key)
+        return
     graph[from_key].add(to_key)
 
 
@@ -52,6 +129,8 @@ def add_edges_from_iterable(graph: dict, iterable: Iterable):
 
 def remove_edge(graph: dict, from_key: Hashable, to_key: Hashable):
     graph[from_key].remove(to_key)
+    if isinstance(graph, IndexedGraph):
+        _unindex_edge(graph, from_key, to_key)
 
 
 def get_edges(graph: dict) -> list:
@@ -59,13 +138,18 @@ def get_edges(graph: dict) -> list:
 
 
 def is_acyclic(graph: dict) -> bool:
-    for path in get_all_complete_paths(graph):
-        if path[0] == path[-1]:
-            return False
+    if isinstance(graph, IndexedGraph):
+        return _get_order(graph) is not None
+    try:
+        get_topological_order(graph)
+    except ValueError:
+        return False
     return True
 
 
 def get_in_neighbors(graph: dict, key: Hashable) -> set:
+    if isinstance(graph, IndexedGraph):
+        return set(graph._in_neighbors[key])
     return set([k for k, n in graph.items() if key in n])
 
 
@@ -74,40 +158,151 @@ def get_out_neighbors(graph: dict, key: Hashable) -> set:
 
 
 def get_in_degree(graph: dict, key: Hashable) -> int:
+    if isinstance(graph, IndexedGraph):
+        return len(graph._in_neighbors[key])
     return len(get_in_neighbors(graph, key))
 
 
 def get_out_degree(graph: dict, key: Hashable) -> int:
-    return len(get_out_neighbors(graph, key))
+    return len(graph[key])
 
 
 def in_degree(graph: dict, key: Hashable) -> int:
-    return len(get_in_neighbors(graph, key))
+    return get_in_degree(graph, key)
 
 
 def out_degree(graph: dict, key: Hashable) -> int:
-    return len(get_out_neighbors(graph, key))
+    return get_out_degree(graph, key)
+
+
+def get_topological_order(graph: dict) -> list:
+    """ Gets the nodes of an acyclic graph in topological order, i.e. every node comes before its children. """
+    if isinstance(graph, IndexedGraph):
+        order = _get_order(graph)
+        if order is None:
+            raise ValueError("A graph with cycles has no topological order.")
+        return sorted(graph, key=order.__getitem__)
+    in_degrees = dict.fromkeys(graph, 0)
+    for node in graph.values():
+        for child in node:
+            in_degrees[child] += 1
+    order = [key for key, degree in in_degrees.items() if not degree]
+    for key in order:
+        for child in graph[key]:
+            in_degrees[child] -= 1
+            if not in_degrees[child]:
+                order.append(child)
+    if len(order) != len(graph):
+        raise ValueError("A graph with cycles has no topological order.")
+    return order
 
 
 def get_complete_paths(graph: dict, key: Hashable, sort: bool = False) -> list:
-    paths = []
-    _get_paths_util(graph, key, paths, [])
+    paths = list(iter_complete_paths(graph, key))
     return sorted(paths, key=lambda x: len(x)) if sort else paths
 
 
 def get_all_complete_paths(graph: dict) -> list:
-    paths = []
-    for key in graph.keys():
-        paths += get_complete_paths(graph, key)
-    return paths
+    return list(iter_all_complete_paths(graph))
+
+
+def iter_complete_paths(graph: dict, key: Hashable) -> Iterator[list]:
+    """ Lazily enumerates the complete paths that start at a node, depth first.
+
+    A complete path ends at a node without children, or at a node that is already on the path (i.e. where the path
+    would start going around a cycle). Only one path is kept in memory at a time, so the enumeration can be stopped
+    early without enumerating the remaining paths, and long paths don't run into the recursion limit.
+
+    :param graph: The graph.
+    :param key: The node the paths start at.
+    :return: An iterator over the paths.
+    """
+    if not graph[key]:
+        return
+    path, on_path, to_visit = [key], {key}, [iter(graph[key])]
+    while to_visit:
+        child = next(to_visit[-1], _end)
+        if child is _end:
+            to_visit.pop()
+            on_path.remove(path.pop())
+        elif child in on_path or not graph[child]:
+            yield path + [child]
+        else:
+            path.append(child)
+            on_path.add(child)
+            to_visit.append(iter(graph[child]))
+
+
+def iter_all_complete_paths(graph: dict) -> Iterator[list]:
+    return chain.from_iterable(iter_complete_paths(graph, key) for key in list(graph.keys()))
+
+
+def count_complete_paths(graph: dict, key: Hashable) -> int:
+    """ Counts the complete paths that start at a node (see `iter_complete_paths`) without enumerating them.
+
+    :param graph: The graph. The part of the graph reachable from the node has to be acyclic.
+    :param key: The node the paths start at.
+    :return: The number of complete paths.
+    """
+    counts = _count_paths_to_sinks(graph, [key])
+    # a node on its own isn't a path
+    return counts[key] if graph[key] else 0
+
+
+def count_all_complete_paths(graph: dict) -> int:
+    """ Counts the complete paths of an acyclic graph without enumerating them. """
+    counts = _count_paths_to_sinks(graph, graph.keys())
+    return sum(counts[key] for key, node in graph.items() if node)
+
+
+def get_descendants(graph: dict, key: Hashable) -> set:
+    """ Gets the nodes that can be reached from a node. """
+    return _search(key, lambda node_key: graph[node_key]) - {key}
+
+
+def get_ancestors(graph: dict, key: Hashable) -> set:
+    """ Gets the nodes that a node can be reached from. """
+    if isinstance(graph, IndexedGraph):
+        return _search(key, graph._in_neighbors.__getitem__) - {key}
+    # build the reverse of the graph once instead of searching the graph for the parents of each node
+    parents = {node_key: [] for node_key in graph.keys()}
+    for node_key, node in graph.items():
+        for child in node:
+            parents[child].append(node_key)
+    return _search(key, parents.__getitem__) - {key}
+
+
+def is_reachable(graph: dict, from_key: Hashable, to_key: Hashable) -> bool:
+    """ Checks whether there is a path from one node to another. The search stops as soon as the node is found.
+
+    In an indexed graph, the descendants of the first node and the ancestors of the second node are searched in turns
+    until they meet (or either runs out), so the search is only as large as the smaller of the two.
+    """
+    if isinstance(graph, IndexedGraph):
+        return _is_reachable_indexed(graph, from_key, to_key)
+    found, to_visit = {from_key}, [from_key]
+    while to_visit:
+        for child in graph[to_visit.pop()]:
+            if child == to_key:
+                return True
+            if child not in found:
+                found.add(child)
+                to_visit.append(child)
+    return False
 
 
 def get_isolated(graph: dict) -> set:
-    return {key for key in graph.keys() if get_in_degree(graph, key) == get_out_degree(graph, key) == 0}
+    if isinstance(graph, IndexedGraph):
+        return {key for key, node in graph.items() if not node and not graph._in_neighbors[key]}
+    has_parents = _get_nodes_with_parents(graph)
+    return {key for key, node in graph.items() if not node and key not in has_parents}
 
 
 def get_sources(graph: dict) -> set:
-    return {key for key in graph.keys() if is_source(graph, key)}
+    if isinstance(graph, IndexedGraph):
+        return {key for key in graph.keys() if not graph._in_neighbors[key]}
+    has_parents = _get_nodes_with_parents(graph)
+    return {key for key in graph.keys() if key not in has_parents}
 
 
 def is_isolated(graph: dict, key: Hashable) -> bool:
@@ -122,26 +317,192 @@ def is_sink(graph: dict, key: Hashable) -> bool:
     return not out_degree(graph, key)
 
 
+def to_csr(graph: dict) -> CSRGraph:
+    """ Freezes a graph into a CSR snapshot. Later changes to the graph don't affect the snapshot.
+
+    :param graph: The graph.
+    :return: The snapshot.
+    """
+    keys = list(graph.keys())
+    ids = {key: i for i, key in enumerate(keys)}
+    # children that aren't nodes of the graph (yet) are numbered after the nodes
+    for node in graph.values():
+        for child in node:
+            if child not in ids:
+                ids[child] = len(keys)
+                keys.append(child)
+    out_degrees = np.zeros(len(keys), dtype=np.int64)
+    out_degrees[:len(graph)] = np.fromiter((len(node) for node in graph.values()), dtype=np.int64, count=len(graph))
+    indptr = np.zeros(len(keys) + 1, dtype=np.int64)
+    np.cumsum(out_degrees, out=indptr[1:])
+    indices = np.fromiter((ids[child] for node in graph.values() for child in node), dtype=np.int64,
+                          count=int(indptr[-1]))
+    return CSRGraph(keys, ids, indptr, indices)
+
+
+def csr_out_degrees(csr: CSRGraph) -> np.ndarray:
+    return np.diff(csr.indptr)
+
+
+def csr_in_degrees(csr: CSRGraph) -> np.ndarray:
+    return np.bincount(csr.indices, minlength=len(csr.keys))
+
+
+def csr_sources(csr: CSRGraph) -> np.ndarray:
+    return np.flatnonzero(csr_in_degrees(csr) == 0)
+
+
+def csr_sinks(csr: CSRGraph) -> np.ndarray:
+    return np.flatnonzero(csr_out_degrees(csr) == 0)
+
+
+def csr_isolated(csr: CSRGraph) -> np.ndarray:
+    return np.flatnonzero((csr_in_degrees(csr) == 0) & (csr_out_degrees(csr) == 0))
+
+
+def csr_bfs_levels(csr: CSRGraph, start_ids: Iterable[int]) -> np.ndarray:
+    """ Gets the number of edges on the shortest path from the start nodes to each node, searching breadth first a
+    whole level at a time.
+
+    :param csr: The snapshot.
+    :param start_ids: The ids of the nodes the search starts at.
+    :return: The level of each node, where nodes that can't be reached have a level of -1.
+    """
+    levels = np.full(len(csr.keys), -1, dtype=np.int64)
+    out_degrees = csr_out_degrees(csr)
+    frontier = np.unique(np.fromiter(start_ids, dtype=np.int64))
+    level = 0
+    while len(frontier):
+        levels[frontier] = level
+        starts, counts = csr.indptr[frontier], out_degrees[frontier]
+        # the positions of the children of every node in the frontier
+        positions = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        children = csr.indices[positions]
+        frontier = np.unique(children[levels[children] == -1])
+        level += 1
+    return levels
+
+
 def merge(graph: dict, to_merge: dict, new_edges: Iterable = None):
     if not graph.keys().isdisjoint(to_merge.keys()):
         warnings.warn("There are some key naming conflicts between the two graphs.")
     # ~ combine the two graph's nodes
-    graph.update(to_merge)
+    if isinstance(graph, IndexedGraph):
+        # add the nodes before their edges, as the edges of a node may lead to nodes that are added after it
+        for key in to_merge:
+            add_node(graph, key)
+        for key, node in to_merge.items():
+            add_node(graph, key, node)
+    else:
+        graph.update(to_merge)
     # ~ add any additional communication if implemented
     if new_edges is not None:
         add_edges_from_iterable(graph, new_edges)
 
 
-def _get_paths_util(graph: dict, key: Hashable, paths: list, prepended: list, start: Hashable = None):
-    prepended += [key]
-    out_neighbors = get_out_neighbors(graph, key)
-
-    if not out_neighbors or key == start:
-        return prepended
-
-    start = key if start is None else start
-
-    for child in out_neighbors:
-        new_path = _get_paths_util(graph, child, paths, list(prepended), start)
-        if new_path:
-            paths.append(new_path)
+def _count_paths_to_sinks(graph: dict, keys: Iterable[Hashable]) -> Dict[Hashable, int]:
+    # counts the paths from each node reachable from the given nodes to the sinks of the graph, visiting the children
+    # of a node before the node itself (iteratively, so that long chains don't run into the recursion limit).
+    counts, on_path = {}, set()
+    for key in keys:
+        if key in counts:
+            continue
+        on_path.add(key)
+        to_visit = [(key, iter(graph[key]))]
+        while to_visit:
+            node_key, children = to_visit[-1]
+            child = next(children, _end)
+            if child is _end:
+                to_visit.pop()
+                on_path.remove(node_key)
+                node = graph[node_key]
+                counts[node_key] = sum(counts[child] for child in node) if node else 1
+            elif child in on_path:
+                raise ValueError("Paths can only be counted in acyclic graphs.")
+            elif child not in counts:
+                on_path.add(child)
+                to_visit.append((child, iter(graph[child])))
+    return counts
+
+
+def _get_nodes_with_parents(graph: dict) -> set:
+    return {child for node in graph.values() for child in node}
+
+
+def _search(key: Hashable, get_neighbors) -> set:
+    found, to_visit = {key}, [key]
+    while to_visit:
+        for neighbor in get_neighbors(to_visit.pop()):
+            if neighbor not in found:
+                found.add(neighbor)
+                to_visit.append(neighbor)
+    return found
+
+
+def _is_reachable_indexed(graph: IndexedGraph, from_key: Hashable, to_key: Hashable) -> bool:
+    # only an order that is up to date is used, as computing it would take longer than the search itself. in an
+    # acyclic graph, a path only passes through the nodes between its ends in the topological order.
+    order = graph._order
+    if order is not None and order[from_key] >= order[to_key]:
+        return False
+    forward, backward = {from_key}, {to_key}
+    forward_to_visit, backward_to_visit = [from_key], [to_key]
+    while forward_to_visit and backward_to_visit:
+        # nodes that only have incoming edges so far have no children container yet
+        for child in graph.get(forward_to_visit.pop(), ()):
+            if child in backward:
+                return True
+            if child not in forward and (order is None or order[child] < order[to_key]):
+                forward.add(child)
+                forward_to_visit.append(child)
+        for parent in graph._in_neighbors[backward_to_visit.pop()]:
+            if parent in forward:
+                return True
+            if parent not in backward and (order is None or order[parent] > order[from_key]):
+                backward.add(parent)
+                backward_to_visit.append(parent)
+    return False
+
+
+def _index_node(graph: IndexedGraph, key: Hashable) -> None:
+    # the node may already be indexed if edges were added to it before it was added to the graph
+    if key not in graph._in_neighbors:
+        graph._in_neighbors[key] = []
+        # a new node has no edges yet, so it can be placed anywhere in the order
+        if graph._order is not None:
+            graph._order[key] = graph._next_position
+            graph._next_position += 1
+
+
+def _index_edge(graph: IndexedGraph, from_key: Hashable, to_key: Hashable) -> None:
+    _index_node(graph, to_key)
+    graph._in_neighbors[to_key].append(from_key)
+    order = graph._order
+    if order is not None and order[from_key] >= order[to_key]:
+        graph._order = None
+
+
+def _unindex_edge(graph: IndexedGraph, from_key: Hashable, to_key: Hashable) -> None:
+    # removing an edge keeps the order valid. a graph without an order is checked for cycles again when needed.
+    graph._in_neighbors[to_key].remove(from_key)
+
+
+def _get_order(graph: IndexedGraph) -> Union[Dict[Hashable, int], None]:
+    # orders the graph again (with Kahn's algorithm) if it changed since it was last ordered. nodes that only have
+    # incoming edges so far have no children container yet.
+    if graph._order is None:
+        in_degrees = {key: len(parents) for key, parents in graph._in_neighbors.items()}
+        order = [key for key, degree in in_degrees.items() if not degree]
+        for key in order:
+            for child in graph.get(key, ()):
+                in_degrees[child] -= 1
+                if not in_degrees[child]:
+                    order.append(child)
+        if len(order) == len(in_degrees):
+            graph._order = {key: position for position, key in enumerate(order)}
+            graph._next_position = len(order)
+    return graph._order
+
+
+# marks the end of an iterator
+_end = object()
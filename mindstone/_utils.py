@@ -14,7 +14,7 @@ Module Structure:
 import inspect
 import math
 import time
-from typing import Callable, Hashable
+from typing import Callable, Hashable, Iterable
 
 import numpy as np
 
@@ -129,15 +129,43 @@ def get_nested(keys: str, mapping: dict, delimiter: str = "."):
     :param delimiter: Delimiter separating the keys.
     :return: The value of the item identified or None, if the value can't be found.
     """
-    return _get_nested_util(keys.split(delimiter), mapping)
+    return get_nested_from_route(keys.split(delimiter), mapping)
 
 
-def _get_nested_util(route: list, mapping: dict = None):
-    key = route.pop(0)
-    if mapping is None or key not in mapping:
-        return None
-    mapping = mapping[key]
-    return mapping if not len(route) else _get_nested_util(route, mapping)
+def get_nested_from_route(route: Iterable[Hashable], mapping: dict):
+    """ Gets a nested item value from a dictionary that can be located by a sequence of keys (route).
+
+    If the item can't be found, a None value is returned.
+
+    :param route: Sequence of keys leading to the item.
+    :param mapping: Dictionary to be searched.
+    :return: The value of the item identified or None, if the value can't be found.
+    """
+    for key in route:
+        if mapping is None or key not in mapping:
+            return None
+        mapping = mapping[key]
+    return mapping
+
+
+def make_hashable(obj) -> Hashable:
+    """ Converts a (possibly nested) object made up of dictionaries, lists, sets, and numpy arrays into an equivalent
+    hashable object, so that objects that are equal produce the same hash.
+
+    :param obj: Object to convert.
+    :return: The hashable object.
+    :raises TypeError: If the object contains a value that can't be hashed.
+    """
+    if isinstance(obj, dict):
+        return dict, frozenset((key, make_hashable(value)) for key, value in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return type(obj), tuple(make_hashable(value) for value in obj)
+    if isinstance(obj, (set, frozenset)):
+        return frozenset, frozenset(make_hashable(value) for value in obj)
+    if isinstance(obj, np.ndarray):
+        return np.ndarray, obj.dtype.str, obj.shape, obj.tobytes()
+    hash(obj)
+    return obj
 
 
 # Mathematics utils
@@ -8,11 +8,13 @@ send the response to the controller. The controller can do what it likes with th
 
 """
 
+import asyncio
 import socket
 import socketserver
 import time
 from abc import ABC, abstractmethod
-from dataclasses import dataclass, is_dataclass
+from collections import deque
+from dataclasses import dataclass, field, is_dataclass
 from typing import Tuple, Dict, Callable, List, Union
 
 # To encode and decode messages, msgpack (https://github.com/msgpack/msgpack-python)
@@ -21,6 +23,8 @@ import msgpack
 
 
 class WorkerABC(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def add_platform(self, type: str) -> None:
         pass
@@ -49,6 +53,26 @@ class WorkerABC(ABC):
     def execute_component(self, key: str, operation: str, kwargs=None) -> None:
         pass
 
+    @abstractmethod
+    def add_event(self, key: str, edge_type: str = "both", bounce_time: int = None) -> None:
+        pass
+
+    @abstractmethod
+    def remove_event(self, key: str) -> None:
+        pass
+
+    @abstractmethod
+    def prepare_request(self, key: str, items: list):
+        pass
+
+    @abstractmethod
+    def remove_prepared(self, key: str) -> None:
+        pass
+
+    @abstractmethod
+    def execute_prepared(self, key: str, parameters: list = None):
+        pass
+
     @abstractmethod
     def get_observations(self, selected: list = None):
         pass
@@ -61,6 +85,10 @@ class WorkerABC(ABC):
     def get_routines(self):
         pass
 
+    @abstractmethod
+    def get_capabilities(self):
+        pass
+
 
 @dataclass
 class Request:
@@ -74,6 +102,11 @@ class Response:
     sent_time: float
     feedback: dict = None
     error: str = None
+    # edge events of the form [component key, edge, timestamp] detected by the worker since its last response.
+    events: list = None
+    # estimated offset of the worker's clock relative to the controller's clock. This is set by the client that
+    # received the response and is not sent by the worker.
+    clock_offset: float = None
 
     @property
     def error_occurred(self) -> bool:
@@ -83,6 +116,22 @@ class Response:
     def time_interval(self) -> float:
         return self.sent_time - self.received_time
 
+    @property
+    def local_received_time(self) -> float:
+        """ The time the worker received the request in controller time. """
+        return self.to_local_time(self.received_time)
+
+    @property
+    def local_sent_time(self) -> float:
+        """ The time the worker sent the response (i.e. made the observations) in controller time. """
+        return self.to_local_time(self.sent_time)
+
+    def to_local_time(self, worker_time: float) -> float:
+        """ Converts a worker timestamp to controller time. If the clock offset has not been estimated,
+        the timestamp is returned as is.
+        """
+        return worker_time if self.clock_offset is None else worker_time - self.clock_offset
+
     @property
     def observations(self) -> Union[dict, None]:
         try:
@@ -91,10 +140,64 @@ class Response:
             pass
 
 
+class ClockEstimator:
+    """ Clock estimator.
+
+    Estimates the offset of a worker's clock relative to the controller's clock, the round trip time, and the jitter
+    of a connection in the same way NTP does. Each request-response exchange provides four timestamps:
+        t0: the time the request was sent (controller clock),
+        t1: the time the request was received (worker clock),
+        t2: the time the response was sent (worker clock),
+        t3: the time the response was received (controller clock).
+    from which
+        offset = ((t1 - t0) + (t2 - t3)) / 2
+        round trip time = (t3 - t0) - (t2 - t1)
+
+    The offset estimate is taken from the sample with the smallest round trip time in a window of recent samples,
+    as that sample is the least affected by queuing delays.
+    """
+
+    def __init__(self, window_size: int = 8):
+        # stores (offset, round trip time) samples
+        self._samples = deque(maxlen=window_size)
+        self.round_trip_time: Union[float, None] = None
+        self.jitter = 0.0
+
+    @property
+    def is_estimated(self) -> bool:
+        return bool(self._samples)
+
+    @property
+    def offset(self) -> Union[float, None]:
+        if not self._samples:
+            return None
+        return min(self._samples, key=lambda sample: sample[1])[0]
+
+    def update(self, request_sent_time: float, request_received_time: float, response_sent_time: float,
+               response_received_time: float) -> None:
+        offset = ((request_received_time - request_sent_time) + (response_sent_time - response_received_time)) / 2
+        round_trip_time = (response_received_time - request_sent_time) - (response_sent_time - request_received_time)
+        # the jitter is the smoothed mean deviation of successive round trip times (see RFC 3550)
+        if self.round_trip_time is not None:
+            self.jitter += (abs(round_trip_time - self.round_trip_time) - self.jitter) / 16
+        self.round_trip_time = round_trip_time
+        self._samples.append((offset, round_trip_time))
+
+    def to_local_time(self, worker_time: float) -> float:
+        return worker_time - (self.offset or 0.0)
+
+    def to_worker_time(self, local_time: float) -> float:
+        return local_time + (self.offset or 0.0)
+
+
 @dataclass
 class ClientABC(ABC):
     target_hostname: str
     target_port: int
+    clock: ClockEstimator = field(default_factory=ClockEstimator, init=False, repr=False, compare=False)
+    # the capabilities of the target worker. These are cached per client, so a new client (connection) will request
+    # them again.
+    _capabilities: Union[Dict[str, Dict[str, set]], None] = field(default=None, init=False, repr=False, compare=False)
 
     @property
     def target_address(self) -> Tuple[str, int]:
@@ -104,12 +207,50 @@ class ClientABC(ABC):
     def send_and_receive(self, to_send: bytes) -> bytes:
         pass
 
+    async def send_and_receive_async(self, to_send: bytes) -> bytes:
+        # clients without a native asynchronous implementation run the blocking one in the event loop's executor
+        return await asyncio.get_running_loop().run_in_executor(None, self.send_and_receive, to_send)
+
     def send_request(self, items: List[Tuple[str, dict]]) -> Response:
+        sent_time = time.time()
         received = self.send_and_receive(encode_transaction({
-            "sent_time": time.time(),
+            "sent_time": sent_time,
+            "items": items
+        }))
+        return self._on_received(sent_time, received)
+
+    async def send_request_async(self, items: List[Tuple[str, dict]]) -> Response:
+        sent_time = time.time()
+        received = await self.send_and_receive_async(encode_transaction({
+            "sent_time": sent_time,
             "items": items
         }))
-        return decode_response(received)
+        return self._on_received(sent_time, received)
+
+    def get_capabilities(self) -> Dict[str, Dict[str, set]]:
+        """ Gets the platforms available on the target worker mapped to their available components, which are in turn
+        mapped to the required setup arguments of the component. The capabilities are only requested from the worker
+        the first time and are cached until they are invalidated.
+        """
+        if self._capabilities is None:
+            response = self.send_request([("get", "capabilities", {})])
+            if response.error_occurred:
+                raise RuntimeError("Could not get the worker's capabilities ({}).".format(response.error))
+            self._capabilities = {
+                platform_key: {component_label: set(required_args)
+                               for component_label, required_args in component_types.items()}
+                for platform_key, component_types in response.feedback["get"]["capabilities"].items()}
+        return self._capabilities
+
+    def invalidate_capabilities(self) -> None:
+        self._capabilities = None
+
+    def _on_received(self, sent_time: float, received: bytes) -> Response:
+        received_time = time.time()
+        response = decode_response(received)
+        self.clock.update(sent_time, response.received_time, response.sent_time, received_time)
+        response.clock_offset = self.clock.offset
+        return response
 
 
 class ServerABC(ABC):
@@ -125,7 +266,7 @@ class _TCPRequestHandler(socketserver.BaseRequestHandler):
     def handle(self) -> None:
         # 1. receive the data from the client
         # self.request is the TCP socket connected to the client
-        received = self.request.recv(1024).strip()
+        received = _receive_transaction(self.request)
         # 2. using the request handler callable, process that data
         # and retrieve the data that should be sent back to the client
         to_send = _TCPRequestHandler.request_handler(received, self.client_address)
@@ -149,12 +290,50 @@ class TCPClient(ClientABC):
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
             # 2. connect to server and request data
             sock.connect((self.target_hostname, self.target_port))
-            sock.send(to_send)
-            # 3. receive data from the server and shut down
-            received = sock.recv(1024)
+            sock.sendall(to_send)
+            # 3. receive data from the server until it closes the connection and shut down
+            chunks = []
+            while True:
+                chunk = sock.recv(_chunk_size)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+        return b"".join(chunks)
+
+    async def send_and_receive_async(self, to_send: bytes) -> bytes:
+        # 1. open a connection to the server
+        reader, writer = await asyncio.open_connection(self.target_hostname, self.target_port)
+        try:
+            # 2. request data without blocking the event loop
+            writer.write(to_send)
+            await writer.drain()
+            # 3. receive data from the server until it closes the connection
+            received = await reader.read()
+        finally:
+            writer.close()
+            await writer.wait_closed()
         return received
 
 
+def _receive_transaction(sock: socket.socket) -> bytes:
+    # msgpack frames are self-delimiting, so receive until a whole transaction has arrived (rather than until the
+    # connection closes, as the client waits for the response before closing it).
+    unpacker = msgpack.Unpacker()
+    chunks = []
+    while True:
+        chunk = sock.recv(_chunk_size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        unpacker.feed(chunk)
+        try:
+            unpacker.skip()
+            break
+        except msgpack.OutOfData:
+            continue
+    return b"".join(chunks)
+
+
 def encode_transaction(to_encode: dict) -> bytes:
     return msgpack.dumps(to_encode.copy())
 
@@ -194,6 +373,8 @@ def _get_unsatisfied_fields(datacls, mapping: dict) -> set:
 
 get_hostname: Callable = socket.gethostname
 
+_chunk_size = 4096
+
 # prevents OSError: [Errno 98] Address already in use
 # This error usually occurs when you quit the server on a device and restart it over a short period of time.
 # This is very annoying.
@@ -9,13 +9,16 @@ Module Structure:
 
 """
 
+import asyncio
+import threading
+import warnings
 from abc import ABC, abstractmethod
-from typing import Tuple, Dict, List, Union, Iterable, Hashable, Callable
+from collections import deque
+from typing import Tuple, Dict, List, Union, Iterable, Hashable, Callable, Collection, Iterator, Any
 
-from ._utils import get_nested
+from ._utils import get_nested_from_route
 from .connection import client_types, ClientABC, Response, WorkerABC
-from .worker import get_available_platforms, get_available_platform_components, \
-    get_available_platform_component_required_setup_args
+from .worker import get_capabilities
 from .plot import Plotter, PlotHandlerABC
 
 
@@ -40,7 +43,12 @@ class MiddlewareABC(ABC):
 
 class ObserverMiddlewareABC(MiddlewareABC):
     def __init__(self):
+        super().__init__()
         self._observables: Dict[Hashable, tuple] = {}
+        # the observables compiled into (component, route, tag, parameter, transformer) accessors, in the order the
+        # observables were added (which is the order they are handled in). They are only rebuilt after the
+        # observables change.
+        self._accessors: Union[List[tuple], None] = None
 
     @abstractmethod
     def handle_observation(self, tag: Hashable, parameter: str, observed_value: float) -> None:
@@ -49,32 +57,181 @@ class ObserverMiddlewareABC(MiddlewareABC):
     def add_observable(self, tag: Hashable, parameter: str, component: str, field: str,
                        transformer: Callable = lambda x: x) -> None:
         self._observables[(tag, parameter)] = component + "." + field, transformer
+        self._accessors = None
 
     def remove_observable(self, tag: Hashable, parameter: str) -> None:
         observable = tag, parameter
         if observable in self._observables:
             del self._observables[observable]
+            self._accessors = None
 
     def handle(self, response: Response) -> None:
+        for tag, parameter, observed_value in self._iter_observations(response):
+            self.handle_observation(tag, parameter, observed_value)
+
+    def _iter_observations(self, response: Response) -> Iterator[Tuple[Hashable, str, Any]]:
         observations = response.observations
         if observations is not None:
+            for component, route, tag, parameter, transformer in self._get_accessors():
+                observed_value = get_nested_from_route(route, observations.get(component, None))
+                # skip this observable if it does not exist in the current observations
+                if observed_value is not None:
+                    yield tag, parameter, transformer(observed_value)
+
+    def _get_accessors(self) -> List[tuple]:
+        if self._accessors is None:
+            self._accessors = []
             for observable, config in self._observables.items():
                 tag, parameter = observable
                 key, transformer = config
-                observed_value = get_nested(key, observations, delimiter=".")
-                # skip this observable if it does not exist in the current observations
-                if observed_value is not None:
-                    self.handle_observation(tag, parameter, transformer(observed_value))
+                component, *route = key.split(".")
+                self._accessors.append((component, tuple(route), tag, parameter, transformer))
+        return self._accessors
+
+
+class EventMiddlewareABC(MiddlewareABC):
+    """ Event middleware class.
+
+    Handles the edge events (see `ControllerABC.add_event`) that are delivered with a response, in the order they
+    were detected by the worker.
+    """
+
+    @abstractmethod
+    def handle_event(self, key: str, edge: str, timestamp: float) -> None:
+        pass
+
+    def handle(self, response: Response) -> None:
+        if response.events is not None:
+            for key, edge, timestamp in response.events:
+                self.handle_event(key, edge, timestamp)
+
+
+class MiddlewarePipeline:
+    """ Middleware pipeline.
+
+    A middleware pipeline lets middleware handle responses on background threads so that a controller can act on a
+    response immediately. Each middleware gets its own lane (a bounded queue and a thread), so a middleware handles
+    responses in the order they were received. When a lane's queue is full, its oldest queued response is dropped.
+
+    A pipeline can be shared by several controllers, in which case a middleware shared by those controllers still
+    only handles one response at a time.
+    """
+
+    def __init__(self, max_queue_size: int = 8):
+        if max_queue_size < 1:
+            raise ValueError("The max queue size can't be less than 1.")
+        self.max_queue_size = max_queue_size
+        # lanes are keyed by the identity of their middleware as middleware are not necessarily hashable.
+        self._lanes: Dict[int, _MiddlewareLane] = {}
+        # the responses dropped by the lanes of removed middleware
+        self._removed_dropped_count = 0
+        self._lock = threading.Lock()
+
+    @property
+    def dropped_count(self) -> int:
+        """ The number of responses that were dropped because a middleware could not keep up. """
+        return self._removed_dropped_count + sum(lane.dropped_count for lane in list(self._lanes.values()))
+
+    def submit(self, middleware: MiddlewareABC, response: Response) -> None:
+        with self._lock:
+            lane = self._lanes.get(id(middleware), None)
+            if lane is None:
+                lane = self._lanes[id(middleware)] = _MiddlewareLane(middleware, self.max_queue_size)
+        lane.put(response)
+
+    def remove(self, middleware: MiddlewareABC) -> None:
+        """ Stops the lane of a middleware once it has handled its queued responses. If the middleware is submitted
+        to again (e.g. by another controller that shares it), it gets a new lane.
+        """
+        with self._lock:
+            lane = self._lanes.pop(id(middleware), None)
+        if lane is not None:
+            lane.close()
+            self._removed_dropped_count += lane.dropped_count
+
+    def join(self) -> None:
+        """ Blocks until every submitted response has been handled (or dropped). """
+        for lane in list(self._lanes.values()):
+            lane.join()
+
+    def close(self) -> None:
+        """ Handles the remaining queued responses and stops the lanes' threads. """
+        with self._lock:
+            lanes, self._lanes = self._lanes, {}
+        for lane in lanes.values():
+            lane.close()
+
+
+class _MiddlewareLane:
+    def __init__(self, middleware: MiddlewareABC, max_queue_size: int):
+        self.middleware = middleware
+        self.dropped_count = 0
+        self._queue = deque()
+        self._max_queue_size = max_queue_size
+        self._condition = threading.Condition()
+        self._busy = False
+        self._active = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def put(self, response: Response) -> None:
+        with self._condition:
+            if len(self._queue) >= self._max_queue_size:
+                self._queue.popleft()
+                self.dropped_count += 1
+            self._queue.append(response)
+            self._condition.notify_all()
+
+    def join(self) -> None:
+        with self._condition:
+            self._condition.wait_for(lambda: not self._queue and not self._busy)
+
+    def close(self) -> None:
+        with self._condition:
+            self._active = False
+            self._condition.notify_all()
+        # a middleware may remove itself while it handles a response, in which case its lane stops after that
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._queue or not self._active)
+                if not self._queue:
+                    return
+                response = self._queue.popleft()
+                self._busy = True
+            try:
+                self.middleware.handle(response)
+            except Exception as e:
+                # don't let a failing response stop the lane from handling the next ones
+                warnings.warn("{} failed to handle a response: {}: {}".format(
+                    self.middleware.__class__.__name__, e.__class__.__name__, e))
+            finally:
+                with self._condition:
+                    self._busy = False
+                    self._condition.notify_all()
 
 
 # Controller
 # ~~~~~~~~~~
+_no_request_items: tuple = ()
+
+
 class ControllerABC(WorkerABC, ABC):
+    # the attributes are declared by the subclasses, so that units that are also builtin containers (see `Gate`) can
+    # use slots. subclasses that don't declare slots get an instance dictionary as usual.
+    __slots__ = ()
+
     def __init__(self, client_details: Tuple[str, int, str] = None):
         self.client: Union[ClientABC, None] = None
         self.middleware: Dict[str, MiddlewareABC] = {}
-        self._request_items: List[tuple] = []
+        # units share an empty default until request items are added to them, which keeps the many units that never
+        # talk to a worker (e.g. most gates in a gate network) small.
+        self._request_items: List[tuple] = _no_request_items
         self._platform_type_key = None
+        self._middleware_pipeline: Union[MiddlewarePipeline, None] = None
         if client_details is not None:
             client_target_host, client_target_port, client_type = client_details
             self.set_client(client_target_host, client_target_port, client_type)
@@ -92,13 +249,18 @@ class ControllerABC(WorkerABC, ABC):
         return bool(self._request_items)
 
     def add_platform(self, type: str) -> None:
-        _check_resource_type("platform", type, get_available_platforms())
+        _check_resource_type("platform", type, self._get_capabilities())
         self._platform_type_key = type
         self.add_request_item("add", "platform", {"type": type})
 
     def add_component(self, key: str, type: str, **setup) -> None:
         self._check_platform_is_set()
-        _check_resource_type("component", type, get_available_platform_components(self._platform_type_key))
+        available_components = self._get_capabilities()[self._platform_type_key]
+        _check_resource_type("component", type, available_components)
+        missing_setup_args = available_components[type] - setup.keys()
+        if missing_setup_args:
+            raise ValueError("Component setup for '{}' does not satisfy all the required fields ({}).".format(
+                key, ", ".join(missing_setup_args)))
         self.add_request_item("add", "component", {"key": key, "type": type, "setup": setup})
 
     def add_routine(self, key: str, interval: float, executor: str, operation: str, **kwargs) -> None:
@@ -123,6 +285,42 @@ class ControllerABC(WorkerABC, ABC):
         self._check_platform_is_set()
         self.add_request_item("execute", "component", {"key": key, "operation": operation, "kwargs": kwargs})
 
+    def add_event(self, key: str, edge_type: str = "both", bounce_time: int = None) -> None:
+        self._check_platform_is_set()
+        self.add_request_item("add", "event", {"key": key, "edge_type": edge_type, "bounce_time": bounce_time})
+
+    def remove_event(self, key: str) -> None:
+        self._check_platform_is_set()
+        self.add_request_item("remove", "event", {"key": key})
+
+    def prepare_request(self, key: str, items: Iterable[tuple] = None) -> None:
+        """ Prepares a request template on the worker, which can later be executed by only sending its key and the
+        parameters that changed (see `execute_prepared`).
+
+        :param key: The key (handle) given to the prepared request.
+        :param items: (method, resource, kwargs) request items. If none are provided, the currently stored request
+            items are used instead and removed from the request.
+        :return: None.
+        """
+        if items is None:
+            items, self._request_items = self._request_items, _no_request_items
+        self.add_request_item("prepare", "request", {"key": key, "items": [list(item) for item in items]})
+
+    def remove_prepared(self, key: str) -> None:
+        self.add_request_item("remove", "prepared", {"key": key})
+
+    def execute_prepared(self, key: str, parameters: Dict[int, dict] = None) -> None:
+        """ Executes a prepared request.
+
+        :param key: The key of the prepared request.
+        :param parameters: Maps the index of a prepared request item to the keyword arguments that should be updated
+            for this execution.
+        :return: None.
+        """
+        self.add_request_item("execute", "prepared", {
+            "key": key, "parameters": [[index, kwargs] for index, kwargs in (parameters or {}).items()]
+        })
+
     def get_observations(self, selected: list = None) -> None:
         self._check_platform_is_set()
         self.add_request_item("get", "observations", {"selected": selected})
@@ -135,10 +333,15 @@ class ControllerABC(WorkerABC, ABC):
         self._check_platform_is_set()
         self.add_request_item("get", "routines", {})
 
+    def get_capabilities(self) -> None:
+        self.add_request_item("get", "capabilities", {})
+
     def add_request_item(self, method: str, resource: str, kwargs) -> None:
         # check if a client is set; throw an error, otherwise
         if not self.client_is_set:
             raise NotImplementedError("Can't submit request as a client has not been set.")
+        if self._request_items is _no_request_items:
+            self._request_items = []
         self._request_items.append((method.lower().strip(), resource.lower().strip(), kwargs))
 
     def request_items_from_iterable(self, iterable: Iterable):
@@ -164,7 +367,18 @@ class ControllerABC(WorkerABC, ABC):
 
     def remove_middleware(self, label: str) -> None:
         if label in self.middleware:
-            del self.middleware[label]
+            middleware = self.middleware.pop(label)
+            if self._middleware_pipeline is not None:
+                self._middleware_pipeline.remove(middleware)
+
+    def set_middleware_pipeline(self, pipeline: MiddlewarePipeline = None) -> None:
+        """ Sets a pipeline that lets the middleware handle received responses in the background instead of before
+        the response is returned. If no pipeline is given, middleware handle responses synchronously again.
+
+        :param pipeline: The middleware pipeline.
+        :return: None.
+        """
+        self._middleware_pipeline = pipeline
 
     def send_request(self) -> Response:
         # make sure that a client is registered for this controller
@@ -172,13 +386,27 @@ class ControllerABC(WorkerABC, ABC):
             raise NotImplementedError("Controller requires a client in order to send a request.")
         # get the received response
         response = self.client.send_request(self._request_items)
-        self._request_items.clear()
+        self._request_items = _no_request_items
         # pass the response through the registered middleware
-        for label, middleware in self.middleware.items():
-            middleware.handle(response)
+        self._handle_response(response)
         # return the response
         return response
 
+    async def send_request_async(self) -> Response:
+        """ Asynchronous version of `send_request`. The calling thread (event loop) is not blocked while the
+        request is being sent and the response is awaited.
+
+        :return: The received response.
+        """
+        if not self.client_is_set:
+            raise NotImplementedError("Controller requires a client in order to send a request.")
+        # take the stored request items before awaiting so that any items added in the mean time are
+        # kept for the next request
+        items, self._request_items = self._request_items, _no_request_items
+        response = await self.client.send_request_async(items)
+        self._handle_response(response)
+        return response
+
     def plot(self):
         plotter = Plotter()
         for middleware in self.middleware.values():
@@ -186,12 +414,26 @@ class ControllerABC(WorkerABC, ABC):
                 middleware.add_to_plot(plotter)
         plotter.plot()
 
+    def _handle_response(self, response: Response) -> None:
+        if not self.middleware:
+            return
+        for label, middleware in self.middleware.items():
+            if self._middleware_pipeline is None:
+                middleware.handle(response)
+            else:
+                self._middleware_pipeline.submit(middleware, response)
+
+    def _get_capabilities(self) -> Dict[str, Dict[str, set]]:
+        # validate against the worker the client connects to. The capabilities of the local worker module are only
+        # used when there is no client to get them from.
+        return self.client.get_capabilities() if self.client_is_set else get_capabilities()
+
     def _check_platform_is_set(self) -> None:
         if self._platform_type_key is None:
             raise NotImplementedError("A platform has not been set.")
 
 
-def _check_resource_type(resource: str, key: str, available: set):
+def _check_resource_type(resource: str, key: str, available: Collection[str]):
     if key not in available:
         raise ValueError("{} key '{}' is invalid. Try: {}".format(resource.title(), key, ", ".join(available)))
 
@@ -215,6 +457,7 @@ class ControllerEnsembleABC(dict, ABC):
         # added middleware
         self._clients: Dict[Hashable, ClientABC] = {}
         self._registered_middleware: Dict[str, MiddlewareABC] = {}
+        self._middleware_pipeline: Union[MiddlewarePipeline, None] = None
         # add passed in clients
         if client_details is not None:
             self.add_clients_from_dict(client_details)
@@ -269,11 +512,39 @@ class ControllerEnsembleABC(dict, ABC):
 
     def add_middleware_to_unit(self, middleware_label: str, tag: Hashable) -> None:
         self.get_unit(tag).add_middleware(middleware_label, self._registered_middleware[middleware_label])
+        if self._middleware_pipeline is not None:
+            self.get_unit(tag).set_middleware_pipeline(self._middleware_pipeline)
+
+    def set_middleware_pipeline(self, pipeline: MiddlewarePipeline = None) -> None:
+        """ Sets a middleware pipeline that is shared by all of the units (see `ControllerABC.set_middleware_pipeline`),
+        including the units that middleware are added to later on.
+        """
+        self._middleware_pipeline = pipeline
+        for unit in self.values():
+            unit.set_middleware_pipeline(pipeline)
 
     def remove_middleware_from_unit(self, middleware_label: str, tag: Hashable):
         if self.get_unit(tag).middleware[middleware_label] is self._registered_middleware[middleware_label]:
             self.get_unit(tag).remove_middleware(middleware_label)
 
+    def send_requests(self, tags: Iterable[Hashable] = None) -> Dict[Hashable, Response]:
+        """ Sends the stored requests of the units concurrently and waits for all of the responses.
+
+        :param tags: Tags of the units whose requests should be sent. By default all units are used.
+        :return: Dictionary mapping the tags of the units that sent a request to their responses.
+        """
+        return asyncio.run(self.send_requests_async(tags))
+
+    async def send_requests_async(self, tags: Iterable[Hashable] = None) -> Dict[Hashable, Response]:
+        """ Asynchronous version of `send_requests`.
+
+        Only units that have a client and stored request items send a request.
+        """
+        tags = [tag for tag in (self.keys() if tags is None else tags)
+                if self[tag].client_is_set and self[tag].request_items_stored]
+        responses = await asyncio.gather(*(self.get_unit(tag).send_request_async() for tag in tags))
+        return dict(zip(tags, responses))
+
     def plot(self):
         plotter = Plotter()
         for middleware in self._registered_middleware.values():
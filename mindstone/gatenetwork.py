@@ -14,45 +14,191 @@ two nodes represents the flow of data from one node to another. This makes it ea
 define, represent, and implement different types of control systems that may
 suit different requirements.
 
+Groups of gates can be assigned to partitions that run in other processes (possibly on other hosts, e.g. next to
+the worker the gates talk to). Both processes define the same network; one serves the partition and the other sends
+the feeds that cross into the partition to it and receives the results of the gates whose edges leave it.
+
 """
 
+import asyncio
+import json
+import pickle
+import re
+import threading
+import time
 import warnings
 from abc import ABC, abstractmethod
-from typing import Tuple, Callable, Hashable, Dict, Iterable, Any
+from collections import deque, OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import reduce
+from multiprocessing import shared_memory
+from types import FunctionType
+from typing import Tuple, Callable, Hashable, Dict, Iterable, Any, Union, FrozenSet, Iterator, AsyncIterable, \
+    AsyncIterator, List, Sized, NamedTuple
+from urllib.parse import urlsplit
 
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
 
 from . import _graph
-from ._utils import get_required_args, get_nested, inner_merge
+from ._utils import get_required_args, get_nested_from_route, inner_merge, make_hashable, TerminalColors
+from .connection import server_types, decode_request, encode_transaction
 from .controller import ControllerABC, ControllerEnsembleABC, MiddlewareABC
 
 
+class GateCache:
+    """ Gate cache.
+
+    A least recently used cache of the results of a gate, keyed on the feed of the gate. This is only valid for
+    gates whose procedures are pure, i.e. their results only depend on their feed.
+    """
+
+    def __init__(self, max_size: int = 128):
+        if max_size < 1:
+            raise ValueError("The max cache size can't be less than 1.")
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._results = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def get(self, feed, run: Callable):
+        """ Gets the cached result for a feed, or runs the gate and caches its result if there isn't one. """
+        try:
+            key = make_hashable(feed)
+        except TypeError:
+            # feeds that can't be hashed bypass the cache
+            self.misses += 1
+            return run(feed)
+        if key in self._results:
+            self.hits += 1
+            self._results.move_to_end(key)
+            return self._results[key]
+        self.misses += 1
+        result = self._results[key] = run(feed)
+        if len(self._results) > self.max_size:
+            self._results.popitem(last=False)
+        return result
+
+    def clear(self) -> None:
+        self._results.clear()
+
+
 class Gate(ControllerABC, set):
-    def __init__(self, procedure: Callable, client_details: Tuple[str, int, str] = None):
+    # networks can have a great many gates, so gates have no instance dictionary. note that the gate itself is the
+    # set of the tags of its children, i.e. it holds the gate's adjacency in the network.
+    __slots__ = ("client", "middleware", "_request_items", "_platform_type_key", "_middleware_pipeline", "feed",
+                 "cache", "uses_process_pool", "batch_capable", "timings", "_procedure", "_procedure_takes_gate")
+
+    def __init__(self, procedure: Callable, client_details: Tuple[str, int, str] = None, cache_size: int = None,
+                 uses_process_pool: bool = False, batch_capable: bool = False):
         super().__init__(client_details)
         self.feed = None
+        self.cache: Union[GateCache, None] = None if cache_size is None else GateCache(cache_size)
+        # if true, the procedure runs in the process pool given to the gate's run (see `GateNetwork.set_process_pool`)
+        self.uses_process_pool = uses_process_pool
+        # if true, the procedure can handle a whole columnar batch as its feed (see `GateNetwork.run_batch`)
+        self.batch_capable = batch_capable
+        # if set to a dictionary, the (start, end) times of the procedure and request sections of a run are stored
+        # in it (see `GateNetworkProfiler`).
+        self.timings: Union[Dict[str, Tuple[float, float]], None] = None
         self._procedure = procedure
+        # inspecting the procedure is expensive, so only do it once.
+        self._procedure_takes_gate = _takes_gate(procedure)
 
     def __call__(self, feed=None):
         return self.run(feed)
 
-    def run(self, feed=None):
+    def run(self, feed=None, process_pool: Executor = None):
+        run = self._run
+        if self.uses_process_pool and process_pool is not None:
+            def run(run_feed=None):
+                return self._run_in_process_pool(process_pool, run_feed)
+        # gates that talk to a worker have side effects, so they bypass the cache.
+        if self.cache is not None and not self.client_is_set:
+            return self.cache.get(feed, run)
+        return run(feed)
+
+    def _run_in_process_pool(self, process_pool: Executor, feed=None):
+        timings = self.timings
+        if timings is not None:
+            procedure_start_time = time.perf_counter()
+        # large arrays in the feed are passed through shared memory instead of being pickled
+        blocks = []
+        try:
+            shared_feed = _share_arrays(feed, blocks)
+            result = process_pool.submit(
+                _run_procedure_in_process, self._procedure, self._procedure_takes_gate, shared_feed).result()
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+        if timings is not None:
+            timings["procedure"] = procedure_start_time, time.perf_counter()
+        return result
+
+    def _run(self, feed=None):
+        timings = self.timings
+        if timings is not None:
+            procedure_start_time = time.perf_counter()
         # add the feed to the gate so that it can be used within a the procedure.
         self.feed = feed
-        if get_required_args(self._procedure):
+        if self._procedure_takes_gate:
             # This means that there are arguments provided and these arguments should be filled with this gate.
             result = self._procedure(self)
         else:
             result = self._procedure()
         # clear the stored field once it is used (there's no point in keeping it around).
         self.feed = None
+        if timings is not None:
+            timings["procedure"] = procedure_start_time, time.perf_counter()
         # if a client is set for this gate and there is a request to be sent, send that request.
         if self.client_is_set and self.request_items_stored:
+            request_start_time = time.perf_counter()
             self.send_request()
+            if timings is not None:
+                timings["request"] = request_start_time, time.perf_counter()
         return result
 
 
-class GateNetwork(ControllerEnsembleABC):
+@dataclass
+class _ExecutionPlan:
+    # maps the tag of a gate to a tuple of (child tag, condition) pairs where the condition is None for unconditional
+    # edges and a (route, evaluator, target) tuple for conditional edges.
+    children: Dict[Hashable, Tuple[Tuple[Hashable, Union[tuple, None]], ...]]
+    # maps the tag of a gate to the tags of the parents that are connected to it with unconditional edges.
+    unconditional_parents: Dict[Hashable, FrozenSet[Hashable]]
+    # maps the tag of a gate to a tuple of (parent tag, condition) pairs for its incoming conditional edges.
+    conditional_parents: Dict[Hashable, Tuple[Tuple[Hashable, tuple], ...]]
+    isolated: set
+    # maps the tags of the gates that run in a partition served by another process to the label of that partition
+    remote_partitions: Dict[Hashable, Hashable] = field(default_factory=dict)
+    # the tags of the gates of the partition served by this process whose edges leave the partition
+    exits: FrozenSet[Hashable] = frozenset()
+    # maps the tag of a gate to the results of its runs (in order, as a gate in a cycle may run several times) in
+    # the last incremental run. As it is part of the plan, it is discarded whenever the network changes.
+    previous_results: Dict[Hashable, list] = field(default_factory=dict)
+    # the (starting tag, hashable feed) of the last incremental run
+    previous_start: Union[tuple, None] = None
+
+
+@dataclass(frozen=True)
+class _Partition:
+    tags: FrozenSet[Hashable]
+    # label of the client connected to the process that serves the partition. if None, the partition runs in this
+    # process.
+    client_label: Hashable = None
+
+
+class _PartitionResults(dict):
+    """ The results of the gates of a partition run by another process, keyed by gate tag. """
+
+
+class GateNetwork(ControllerEnsembleABC, _graph.IndexedGraph):
     def __init__(self, max_epochs: int = None, gates: dict = None, edges: Iterable[Tuple[Hashable, Hashable]] = None,
                  client_details: Dict[Hashable, Tuple[str, int, str]] = None,
                  middleware_details: Dict[str, MiddlewareABC] = None):
@@ -62,6 +208,14 @@ class GateNetwork(ControllerEnsembleABC):
         # dict: stores all the conditional edges where a key is a edge tuple and a value
         # is a condition tuple of the form (key, evaluation, value)
         self._conditional_edges: Dict[Tuple[Hashable, Hashable], Tuple[str, Callable, Any]] = {}
+        # the network compiled for running. it is rebuilt the next time the network runs after a gate or edge changes.
+        self._plan: Union[_ExecutionPlan, None] = None
+        self._process_pool: Union[Executor, None] = None
+        # threads that dispatch the gates that run in the process pool, so that they run in parallel
+        self._dispatcher: Union[ThreadPoolExecutor, None] = None
+        self._partitions: Dict[Hashable, _Partition] = {}
+        # label of the partition this process serves (see `serve_partition`)
+        self._served_partition: Hashable = None
         # set the max epochs given
         if max_epochs is not None:
             self.set_max_epochs(max_epochs)
@@ -72,15 +226,179 @@ class GateNetwork(ControllerEnsembleABC):
         if edges is not None:
             self.add_edges_from_iterable(edges)
 
-    def run(self, starting_tag: Hashable, feed=None):
-        # ~ check if anny gates have no other gates connected to it
-        # and warn the user if there are more than one gates.
-        # this is useful for finding gates that we redundantly added.
-        isolated = _graph.get_isolated(self)
-        if len(isolated) and len(self) > 1:
-            warnings.warn("Isolated: {}".format(', '.join(isolated)))
+    def run(self, starting_tag: Hashable, feed=None, executor: Executor = None, incremental: bool = False,
+            profiler: "GateNetworkProfiler" = None):
+        """ Runs the network.
+
+        :param starting_tag: Tag of the gate the network starts from.
+        :param feed: The feed passed to the starting gate.
+        :param executor: If provided, the gates of each generation are run concurrently with this executor (e.g. a
+            ThreadPoolExecutor for gates that wait on worker clients or HTTP calls). Note that gates that share
+            middleware may then use that middleware concurrently.
+        :param incremental: If true, only the gates downstream of a change since the last incremental run are run
+            again, and the other gates reuse their previous results. The changes are the starting feed and the results
+            of gates with clients (or in remote partitions), which are always run. This assumes that the procedures of
+            gates without clients are pure.
+        :param profiler: If provided, the gate runs and epochs of this run are recorded by the profiler.
+        :return: The results of the resolved gates.
+        """
+        self._warn_isolated()
         # ~ finally, run the network and return the result
-        return self._resolve_all(starting_tag, feed)
+        resolved, self.epoch_count = self._resolve_all(
+            starting_tag, feed, executor, self._get_incremental_run_gate(starting_tag, feed) if incremental else None,
+            profiler)
+        return resolved
+
+    def clear_previous_results(self) -> None:
+        """ Clears the results kept by incremental runs, so that every gate runs again in the next run. """
+        plan = self._get_plan()
+        plan.previous_results.clear()
+        plan.previous_start = None
+
+    def run_batch(self, starting_tag: Hashable, batch: Dict[str, np.ndarray]) -> Dict[Hashable, "BatchResult"]:
+        """ Runs the network for every row of a columnar batch at once.
+
+        The network is traversed once in topological order. Batch-capable gates get the columns of all the rows that
+        reach them as their feed and should return a dictionary of columns of the same length. Other gates are run
+        for each row, and their results are stacked into columns (or into a single column if the results aren't
+        dictionaries). Conditional edges are evaluated as boolean masks, so each child only gets the sub-batch of rows
+        whose condition holds. A gate with several unconditional parents gets the rows that all of them produced.
+
+        :param starting_tag: Tag of the gate the network starts from.
+        :param batch: Dictionary of equally long arrays (columns), where each row is a feed.
+        :return: The results of the resolved gates, with the indices of the rows each result is for.
+        """
+        self._warn_isolated()
+        lengths = {len(column) for column in batch.values()}
+        if len(lengths) > 1:
+            raise ValueError("The columns of a batch must all have the same length.")
+        plan = self._get_plan()
+        results: Dict[Hashable, BatchResult] = {}
+        for tag in self._get_topological_order(starting_tag):
+            if tag == starting_tag:
+                feeds = [BatchResult(np.arange(lengths.pop() if lengths else 0), dict(batch))]
+            else:
+                feeds = self._get_batch_feeds(tag, plan, results)
+            results_of_feeds = [self._run_gate_batch(tag, feed) for feed in feeds if len(feed.rows)]
+            if results_of_feeds:
+                results[tag] = _concatenate_batches(results_of_feeds)
+        return {tag: result for tag, result in results.items() if not plan.children[tag]}
+
+    def stream(self, starting_tag: Hashable, feeds: Iterable, max_in_flight: int = 2) -> Iterator[dict]:
+        """ Runs the network for each feed in a sequence of feeds, pipelining the feeds through the network.
+
+        Each gate handles the feeds one at a time and in order, so while a downstream gate works on one feed, an
+        upstream gate can already handle the next one.
+
+        :param starting_tag: Tag of the gate the network starts from.
+        :param feeds: The feeds passed to the starting gate.
+        :param max_in_flight: The maximum number of feeds that can be in the network at the same time.
+        :return: The results of the resolved gates for each feed, in the order of the feeds.
+        """
+        if max_in_flight < 1:
+            raise ValueError("The max number of feeds in flight can't be less than 1.")
+        self._warn_isolated()
+        turnstile = _GateTurnstile()
+        with ThreadPoolExecutor(max_in_flight) as executor:
+            in_flight = deque()
+            for sequence, feed in enumerate(feeds):
+                if len(in_flight) == max_in_flight:
+                    yield in_flight.popleft().result()
+                turnstile.enter(sequence)
+                in_flight.append(executor.submit(self._resolve_streamed, turnstile, sequence, starting_tag, feed))
+            while in_flight:
+                yield in_flight.popleft().result()
+
+    async def stream_async(self, starting_tag: Hashable, feeds: AsyncIterable,
+                           max_in_flight: int = 2) -> AsyncIterator[dict]:
+        """ Asynchronous version of `stream` that accepts an asynchronous iterable of feeds. """
+        if max_in_flight < 1:
+            raise ValueError("The max number of feeds in flight can't be less than 1.")
+        self._warn_isolated()
+        loop = asyncio.get_running_loop()
+        turnstile = _GateTurnstile()
+        with ThreadPoolExecutor(max_in_flight) as executor:
+            in_flight = deque()
+            sequence = 0
+            async for feed in feeds:
+                if len(in_flight) == max_in_flight:
+                    yield await in_flight.popleft()
+                turnstile.enter(sequence)
+                in_flight.append(loop.run_in_executor(
+                    executor, self._resolve_streamed, turnstile, sequence, starting_tag, feed))
+                sequence += 1
+            while in_flight:
+                yield await in_flight.popleft()
+
+    def set_process_pool(self, process_pool: Executor = None) -> None:
+        """ Sets the process pool (e.g. a ProcessPoolExecutor) that runs the procedures of the gates that were added
+        with `use_process_pool` set, so that CPU-heavy gates can run in parallel. If no process pool is set, those
+        gates run in this process like every other gate.
+
+        :param process_pool: The process pool.
+        :return: None.
+        """
+        if self._dispatcher is not None:
+            self._dispatcher.shutdown()
+        self._process_pool = process_pool
+        self._dispatcher = None if process_pool is None else ThreadPoolExecutor()
+
+    def add_partition(self, label: Hashable, tags: Iterable[Hashable], client_label: Hashable = None) -> None:
+        """ Assigns a group of gates to a partition.
+
+        If a client is given, the gates of the partition run in the process the client connects to, which serves
+        the partition of the same network (see `serve_partition`). Feeds that cross an edge into the partition are
+        sent to that process, which runs the gates of the partition and sends back the results of the gates whose
+        edges leave the partition (or that are resolved). Gates of a partition can't join results from both inside
+        and outside of it. The tags of remote gates and their feeds and results must be encodable by msgpack. Batches
+        (see `run_batch`) always run in this process.
+
+        :param label: Label of the partition.
+        :param tags: Tags of the gates in the partition.
+        :param client_label: Label of the client connected to the process that serves the partition.
+        :return: None.
+        """
+        tags = frozenset(tags)
+        for tag in tags:
+            if tag not in self:
+                raise ValueError("Gate '{}' is not in the network.".format(tag))
+        for other_label, partition in self._partitions.items():
+            if other_label != label and not tags.isdisjoint(partition.tags):
+                raise ValueError("Gates '{}' are already in partition '{}'.".format(
+                    "', '".join(map(str, tags & partition.tags)), other_label))
+        if client_label is not None and client_label not in self._clients:
+            raise ValueError("Client '{}' does not exist.".format(client_label))
+        self._partitions[label] = _Partition(tags, client_label)
+        self._plan = None
+
+    def remove_partition(self, label: Hashable) -> None:
+        if label in self._partitions:
+            del self._partitions[label]
+            self._plan = None
+
+    def serve_partition(self, label: Hashable, hostname: str = "", port: int = 50001,
+                        connection_type: str = "tcp") -> None:
+        """ Serves a partition of the network, so that other processes that define the same network can run the gates
+        of the partition in this process.
+
+        :param label: Label of the partition.
+        :param hostname: Hostname the server listens on.
+        :param port: Port the server listens on.
+        :param connection_type: The type of connection (see `mindstone.connection.server_types`).
+        :return: None.
+        """
+        if label not in self._partitions:
+            raise ValueError("Partition '{}' does not exist.".format(label))
+        self._served_partition = label
+        self._plan = None
+        print("{}SERVING PARTITION '{}' @ ({}){}".format(TerminalColors.HEADER, label, port, TerminalColors.ENDC))
+        print("Press CTRL+C to end the server.")
+        print("-" * 50)
+        try:
+            server_types[connection_type].serve(hostname=hostname, port=port, on_receive=self._on_partition_receive)
+        finally:
+            self._served_partition = None
+            self._plan = None
 
     def set_max_epochs(self, n: int) -> None:
         if n < 1:
@@ -91,16 +409,45 @@ class GateNetwork(ControllerEnsembleABC):
         return self._max_epochs
 
     def gate_procedure(self, tag: Hashable, client_label: str = None,
-                       middleware_labels: Iterable[str] = None) -> Callable:
+                       middleware_labels: Iterable[str] = None, cacheable: bool = False,
+                       cache_size: int = 128, use_process_pool: bool = False,
+                       batch_capable: bool = False) -> Callable:
         def decorator_repeat(func):
-            self.add_gate(tag, func, client_label, middleware_labels)
+            self.add_gate(tag, func, client_label, middleware_labels, cacheable, cache_size, use_process_pool,
+                          batch_capable)
 
         return decorator_repeat
 
     def add_gate(self, tag: Hashable, procedure: Callable, client_label: str = None,
-                 middleware_labels: Iterable[str] = None) -> None:
-        gate = Gate(procedure)
+                 middleware_labels: Iterable[str] = None, cacheable: bool = False, cache_size: int = 128,
+                 use_process_pool: bool = False, batch_capable: bool = False) -> None:
+        """ Adds a gate to the network.
+
+        :param tag: Tag given to the gate.
+        :param procedure: The procedure the gate runs.
+        :param client_label: Label of the client used by the gate.
+        :param middleware_labels: Labels of the middleware used by the gate.
+        :param cacheable: If true, the results of the gate are cached (see `GateCache`). Only pure gates should be
+            cacheable. Gates with a client are never cached.
+        :param cache_size: The maximum number of cached results.
+        :param use_process_pool: If true, the procedure of the gate runs in the network's process pool (see
+            `set_process_pool`). The procedure must be picklable and can only use the feed of the gate it is given.
+            Gates that use the process pool can't have a client.
+        :param batch_capable: If true, the procedure of the gate handles whole columnar batches (dictionaries of
+            arrays) when the network is run with `run_batch`.
+        :return: None.
+        """
+        if use_process_pool:
+            if client_label is not None:
+                raise ValueError("Gates that use the process pool can't have a client.")
+            try:
+                pickle.dumps(procedure)
+            except (pickle.PicklingError, AttributeError, TypeError) as e:
+                raise ValueError("The procedure of gate '{}' can't be pickled ({}).".format(tag, e))
+        gate = Gate(procedure, cache_size=cache_size if cacheable else None, uses_process_pool=use_process_pool,
+                    batch_capable=batch_capable)
         _graph.add_node(self, tag, gate)
+        self._plan = None
         # prime the gate for use
         # - if one is provided, add a client to the gate
         if client_label is not None:
@@ -111,6 +458,10 @@ class GateNetwork(ControllerEnsembleABC):
 
     def remove_gate(self, tag: Hashable) -> None:
         _graph.remove_node(self, tag)
+        for label, partition in self._partitions.items():
+            if tag in partition.tags:
+                self._partitions[label] = _Partition(partition.tags - {tag}, partition.client_label)
+        self._plan = None
 
     def add_gates_from_dict(self, gate_details: Dict[Hashable, Tuple]):
         for tag, details in gate_details.items():
@@ -123,9 +474,11 @@ class GateNetwork(ControllerEnsembleABC):
 
     def add_edge(self, from_tag: Hashable, to_tag: Hashable) -> None:
         _graph.add_edge(self, from_tag, to_tag)
+        self._plan = None
 
     def remove_edge(self, from_tag: Hashable, to_tag: Hashable) -> None:
         _graph.remove_edge(self, from_tag, to_tag)
+        self._plan = None
 
     def add_edges_from_iterable(self, edges: Iterable[Tuple[Hashable, Hashable]]):
         for edge in edges:
@@ -149,10 +502,11 @@ class GateNetwork(ControllerEnsembleABC):
         """
         self._conditional_edges[(from_tag, to_tag)] = (path, evaluator, target)
         self.add_edge(from_tag, to_tag)
+        self._plan = None
         if fallback_tag is not None:
             # create the compliment conditional edge with a a connection from the from tag to the fallback tag,
             # if a fallback is set
-            self.add_conditional_edge(from_tag, fallback_tag, target, path, lambda a, b: not evaluator(a, b))
+            self.add_conditional_edge(from_tag, fallback_tag, target, path, _negate_evaluator(evaluator))
 
     def remove_conditional_edge(self, from_tag: Hashable, to_tag: Hashable) -> None:
         edge = (from_tag, to_tag)
@@ -160,40 +514,278 @@ class GateNetwork(ControllerEnsembleABC):
             del self._conditional_edges[edge]
         self.remove_edge(from_tag, to_tag)
 
-    def _resolve_all(self, starting_tag: Hashable, initial_feed=None):
-        current_generation = {starting_tag: self[starting_tag].run(initial_feed)}
+    def _warn_isolated(self) -> None:
+        # ~ check if anny gates have no other gates connected to it
+        # and warn the user if there are more than one gates.
+        # this is useful for finding gates that we redundantly added.
+        isolated = self._get_plan().isolated
+        if len(isolated) and len(self) > 1:
+            warnings.warn("Isolated: {}".format(', '.join(map(str, isolated))))
+
+    def _get_plan(self) -> _ExecutionPlan:
+        if self._plan is None:
+            self._plan = self._compile()
+        return self._plan
+
+    def _compile(self) -> _ExecutionPlan:
+        remote_partitions = {tag: label for label, partition in self._partitions.items()
+                             if partition.client_label is not None and label != self._served_partition
+                             for tag in partition.tags}
+        served = None if self._served_partition is None else self._partitions[self._served_partition].tags
+        exits = set()
+        # the unconditional parents of the gates including the ones behind partition boundaries
+        partition_parents = {tag: set() for partition in self._partitions.values() for tag in partition.tags}
+        children = {}
+        parents = {tag: set() for tag in self.keys()}
+        conditional_parents = {tag: [] for tag in self.keys()}
+        for tag, gate in self.items():
+            gate_children = []
+            for child_tag in gate:
+                if child_tag in partition_parents and (tag, child_tag) not in self._conditional_edges:
+                    partition_parents[child_tag].add(tag)
+                # the edges within a remote partition are followed by the process that serves it, and the edges that
+                # leave the served partition by the process that sent the feed.
+                if tag in remote_partitions and remote_partitions.get(child_tag, None) == remote_partitions[tag]:
+                    continue
+                if served is not None and tag in served and child_tag not in served:
+                    exits.add(tag)
+                    continue
+                condition = self._conditional_edges.get((tag, child_tag), None)
+                if condition is None:
+                    parents[child_tag].add(tag)
+                else:
+                    location, evaluator, target = condition
+                    condition = tuple(location.split(".")), evaluator, target
+                    conditional_parents[child_tag].append((tag, condition))
+                gate_children.append((child_tag, condition))
+            children[tag] = tuple(gate_children)
+        for label, partition in self._partitions.items():
+            for tag in partition.tags:
+                if partition_parents[tag] & partition.tags and partition_parents[tag] - partition.tags:
+                    raise ValueError("Gate '{}' of partition '{}' joins gates from inside and outside of it.".format(
+                        tag, label))
+        return _ExecutionPlan(
+            children=children,
+            unconditional_parents={tag: frozenset(tag_parents) for tag, tag_parents in parents.items()},
+            conditional_parents={tag: tuple(tag_parents) for tag, tag_parents in conditional_parents.items()},
+            isolated=_graph.get_isolated(self),
+            remote_partitions=remote_partitions,
+            exits=frozenset(exits)
+        )
+
+    def _get_topological_order(self, starting_tag: Hashable) -> list:
+        plan = self._get_plan()
+        reachable, to_visit = {starting_tag}, [starting_tag]
+        while to_visit:
+            for child_tag, _ in plan.children[to_visit.pop()]:
+                if child_tag not in reachable:
+                    reachable.add(child_tag)
+                    to_visit.append(child_tag)
+        in_degrees = dict.fromkeys(reachable, 0)
+        for tag in reachable:
+            for child_tag, _ in plan.children[tag]:
+                in_degrees[child_tag] += 1
+        order = [tag for tag, in_degree in in_degrees.items() if not in_degree]
+        for tag in order:
+            for child_tag, _ in plan.children[tag]:
+                in_degrees[child_tag] -= 1
+                if not in_degrees[child_tag]:
+                    order.append(child_tag)
+        if len(order) != len(reachable):
+            raise ValueError("Batches can only be run through acyclic networks.")
+        return order
+
+    def _get_batch_feeds(self, tag: Hashable, plan: _ExecutionPlan,
+                         results: Dict[Hashable, "BatchResult"]) -> List["BatchResult"]:
+        feeds = []
+        parent_tags = plan.unconditional_parents[tag]
+        if parent_tags and parent_tags.issubset(results):
+            rows = reduce(np.intersect1d, [results[parent_tag].rows for parent_tag in parent_tags])
+            columns = {}
+            for parent_tag in parent_tags:
+                result = results[parent_tag]
+                columns.update(_index_columns(result.columns, np.searchsorted(result.rows, rows)))
+            feeds.append(BatchResult(rows, columns))
+        for parent_tag, condition in plan.conditional_parents[tag]:
+            if parent_tag in results:
+                result = results[parent_tag]
+                mask = _evaluate_batch_condition(condition, result.columns, len(result.rows))
+                feeds.append(BatchResult(result.rows[mask], _index_columns(result.columns, mask)))
+        return feeds
+
+    def _run_gate_batch(self, tag: Hashable, feed: "BatchResult") -> "BatchResult":
+        gate = self[tag]
+        if gate.batch_capable:
+            columns = gate.run(feed.columns, self._process_pool)
+        else:
+            columns = _stack_rows([gate.run(_get_row(feed.columns, i), self._process_pool)
+                                   for i in range(len(feed.rows))])
+        return BatchResult(feed.rows, {} if columns is None else columns)
+
+    def _run_gate(self, tag: Hashable, feed=None):
+        label = self._get_plan().remote_partitions.get(tag, None)
+        if label is not None:
+            return self._run_remote_partition(label, tag, feed)
+        return self[tag].run(feed, self._process_pool)
+
+    def _get_incremental_run_gate(self, starting_tag: Hashable, feed=None) -> Callable:
+        """ Gets the gate runner of an incremental run, which marks the gates it runs as dirty. A gate only runs
+        again if it is a source of change or one of its parents is dirty. Otherwise it returns its previous result,
+        without looking at its feed.
+        """
+        plan = self._get_plan()
+        try:
+            start = starting_tag, make_hashable(feed)
+        except TypeError:
+            # changes to feeds that can't be hashed can't be detected
+            start = None
+        # the previous results only follow from the same starting gate
+        if start is None or plan.previous_start is None or plan.previous_start[0] != starting_tag:
+            plan.previous_results.clear()
+        dirty = set() if start is not None and start == plan.previous_start else {starting_tag}
+        plan.previous_start = start
+        # the number of times each gate ran in this run
+        run_counts = {}
+
+        def run_gate(tag: Hashable, gate_feed=None):
+            i = run_counts[tag] = run_counts.get(tag, 0) + 1
+            previous = plan.previous_results.setdefault(tag, [])
+            # gates that talk to a worker are sources of change, so they are always run. the same goes for remote
+            # gates as they may talk to a worker that is only known to the process that serves them.
+            if i <= len(previous) and tag not in dirty and not self[tag].client_is_set \
+                    and tag not in plan.remote_partitions and dirty.isdisjoint(plan.unconditional_parents[tag]) \
+                    and not any(parent in dirty for parent, _ in plan.conditional_parents[tag]):
+                return previous[i - 1]
+            result = self._run_gate(tag, gate_feed)
+            dirty.add(tag)
+            if isinstance(result, _PartitionResults):
+                # the results of the other gates of a remote partition are merged into the run as well
+                dirty.update(result)
+            previous[i - 1:i] = [result]
+            return result
+
+        return run_gate
+
+    def _run_remote_partition(self, label: Hashable, tag: Hashable, feed=None) -> _PartitionResults:
+        client = self._clients[self._partitions[label].client_label]
+        response = client.send_request([("run", "partition", {"label": label, "tag": tag, "feed": feed})])
+        if response.error_occurred:
+            raise RuntimeError("Partition '{}' failed to run gate '{}' ({}).".format(label, tag, response.error))
+        # the results are sent as (tag, result) pairs as msgpack only accepts string keys
+        return _PartitionResults(response.feedback["run"]["partition"])
+
+    def _run_served_partition(self, label: Hashable, tag: Hashable, feed=None) -> list:
+        if label != self._served_partition:
+            raise ValueError("Partition '{}' is not served here.".format(label))
+        if tag not in self._partitions[label].tags:
+            raise ValueError("Gate '{}' is not in partition '{}'.".format(tag, label))
+        plan = self._get_plan()
+        exit_results = {}
+
+        def run_gate(gate_tag: Hashable, gate_feed=None):
+            result = self._run_gate(gate_tag, gate_feed)
+            if gate_tag in plan.exits:
+                exit_results[gate_tag] = result
+            return result
+
+        resolved, _ = self._resolve_all(tag, feed, run_gate=run_gate)
+        resolved.update(exit_results)
+        return list(resolved.items())
+
+    def _on_partition_receive(self, received: bytes, client_address: tuple = None) -> bytes:
+        response = {"received_time": time.time(), "error": None}
+        try:
+            request = decode_request(received)
+            feedback = {}
+            for method, resource, kwargs in request.items:
+                if (method, resource) != ("run", "partition"):
+                    raise RuntimeError("Method '{}' is not supported for resource '{}'.".format(method, resource))
+                inner_merge(feedback, method, {resource: self._run_served_partition(**kwargs)})
+            response["feedback"] = feedback
+        except (RuntimeError, ValueError, TypeError) as e:
+            # report the error back to the sender instead of terminating the server.
+            response["error"] = "{}: {}".format(e.__class__.__name__, str(e))
+            print(TerminalColors.FAIL + "\t!!! " + response["error"] + TerminalColors.ENDC)
+        response["sent_time"] = time.time()
+        return encode_transaction(response)
+
+    def _run_gates(self, feeds: Dict[Hashable, Any], executor: Executor = None, run_gate: Callable = None) -> dict:
+        run_gate = self._run_gate if run_gate is None else run_gate
+        results = self._run_gates_locally(feeds, executor, run_gate)
+        if not any(isinstance(result, _PartitionResults) for result in results.values()):
+            return results
+        # the results of the gates of a remote partition replace the result of the gate the partition was entered by
+        expanded = {}
+        for tag, result in results.items():
+            if isinstance(result, _PartitionResults):
+                expanded.update(result)
+            else:
+                expanded[tag] = result
+        return expanded
+
+    def _run_gates_locally(self, feeds: Dict[Hashable, Any], executor: Executor, run_gate: Callable) -> dict:
+        if executor is None and self._dispatcher is not None and len(feeds) > 1:
+            # dispatch the gates that run in the process pool first, so that they run in parallel with each other
+            # while the remaining gates run on this thread.
+            futures = {tag: self._dispatcher.submit(run_gate, tag, feed) for tag, feed in feeds.items()
+                       if self[tag].uses_process_pool}
+            results = {tag: run_gate(tag, feed) for tag, feed in feeds.items() if tag not in futures}
+            return {tag: futures[tag].result() if tag in futures else results[tag] for tag in feeds}
+        if executor is None or len(feeds) < 2:
+            return {tag: run_gate(tag, feed) for tag, feed in feeds.items()}
+        futures = {tag: executor.submit(run_gate, tag, feed) for tag, feed in feeds.items()}
+        # collect the results in the order the gates were submitted, so that they are merged in the same order as
+        # they would have been when run sequentially.
+        return {tag: future.result() for tag, future in futures.items()}
+
+    def _resolve_streamed(self, turnstile: "_GateTurnstile", sequence: int, starting_tag: Hashable, feed=None):
+        try:
+            resolved, _ = self._resolve_all(starting_tag, feed, run_gate=lambda tag, gate_feed: turnstile.run(
+                sequence, tag, lambda: self._run_gate(tag, gate_feed)))
+            return resolved
+        finally:
+            turnstile.exit(sequence)
+
+    def _resolve_all(self, starting_tag: Hashable, initial_feed=None, executor: Executor = None,
+                     run_gate: Callable = None, profiler: "GateNetworkProfiler" = None) -> Tuple[dict, int]:
+        # the epochs are counted per call, as streamed runs and served partitions resolve the network concurrently.
+        plan = self._get_plan()
+        if profiler is not None:
+            run_gate = profiler.wrap(self, self._run_gate if run_gate is None else run_gate)
+            profiler.start_epoch()
+        current_generation = self._run_gates({starting_tag: initial_feed}, run_gate=run_gate)
+        if profiler is not None:
+            profiler.end_epoch()
         # unsatisfied stores the tags and activation results of the gates that still expect to be used
         # later on in the network
         unsatisfied = {}
         # a gate is resolved if it is activated and has no descendant connections.
         resolved = {}
-        self.epoch_count = 0
+        epoch_count = 0
         while True:
             to_be_evaluated = {}
             current_generation_copy = current_generation.copy()
             for current_tag, current_result in current_generation_copy.items():
-                current_gate: Gate = self[current_tag]
+                current_children = plan.children[current_tag]
                 # if the gate has no children, add it the resolved stack as it wont be needed later on in the
                 # evolution of the network.
-                if not len(current_gate):
+                if not current_children:
                     resolved[current_tag] = current_generation.pop(current_tag)
                     continue
                 # prime next generation
-                for child_tag in current_gate:
+                for child_tag, condition in current_children:
                     # evaluate the conditional edge case
-                    conditional_edge = self._conditional_edges.get((current_tag, child_tag), None)
-                    unconditional_parents = {current_tag}
-                    if conditional_edge is not None:
+                    if condition is not None:
                         if not isinstance(current_result, dict):
                             continue
-                        location, evaluator, target = conditional_edge
+                        route, evaluator, target = condition
                         # weed out all the failed conditional edges i.e. don't evaluate the nodes where the condition
                         # came out to false
-                        if not evaluator(get_nested(location, current_result), target):
+                        if not evaluator(get_nested_from_route(route, current_result), target):
                             continue
+                        unconditional_parents = {current_tag}
                     else:
-                        unconditional_parents = {parent_tag for parent_tag in _graph.get_in_neighbors(self, child_tag)
-                                                 if (parent_tag, child_tag) not in self._conditional_edges}
+                        unconditional_parents = plan.unconditional_parents[child_tag]
                     # make sure to check against the copy because the generation changes with each child
                     descendants = unsatisfied.pop(child_tag, {})
                     descendants.update(current_generation_copy)
@@ -209,12 +801,362 @@ class GateNetwork(ControllerEnsembleABC):
                         # is around when that evaluation takes place by adding it back into the generation
                         inner_merge(unsatisfied, child_tag, {current_tag: current_result})
             # replace the current generation with its copy.
-            current_generation.update({next_tag: self[next_tag].run(next_feed)
-                                       for next_tag, next_feed in to_be_evaluated.items()})
-            self.epoch_count += 1
+            if profiler is not None:
+                profiler.start_epoch()
+            current_generation.update(self._run_gates(to_be_evaluated, executor, run_gate))
+            if profiler is not None:
+                profiler.end_epoch()
+            epoch_count += 1
             # if all the gates in this generation have been resolve, stop the main loop and return the resolve
-            if not len(current_generation) or self.epoch_count == self._max_epochs:
-                return resolved
+            if not len(current_generation) or epoch_count == self._max_epochs:
+                return resolved, epoch_count
+
+
+@dataclass
+class _GateRunRecord:
+    tag: Hashable
+    thread_id: int
+    epoch: int
+    start_time: float
+    end_time: float
+    feed_size: Union[int, None]
+    # the (start, end) times of the sections of the run (procedure, request)
+    sections: Dict[str, Tuple[float, float]]
+
+
+class GateNetworkProfiler:
+    """ Gate network profiler.
+
+    Records the gate runs and epochs of the network runs it is passed to (see `GateNetwork.run`). For each gate run,
+    the start and end times, the time spent in the gate's procedure and in sending its request, and the size (number
+    of items) of its feed are recorded. The records can be exported as Chrome trace events (viewable in
+    chrome://tracing or Perfetto) or aggregated per gate.
+    """
+
+    def __init__(self):
+        self.gate_records: List[_GateRunRecord] = []
+        # (start time, end time) of each recorded epoch
+        self.epoch_records: List[Tuple[float, float]] = []
+        self._epoch = -1
+        self._epoch_start_time = None
+        self._lock = threading.Lock()
+
+    def clear(self) -> None:
+        with self._lock:
+            self.gate_records.clear()
+            self.epoch_records.clear()
+            self._epoch = -1
+            self._epoch_start_time = None
+
+    def start_epoch(self) -> None:
+        with self._lock:
+            self._epoch += 1
+            self._epoch_start_time = time.perf_counter()
+
+    def end_epoch(self) -> None:
+        with self._lock:
+            self.epoch_records.append((self._epoch_start_time, time.perf_counter()))
+
+    def wrap(self, network: "GateNetwork", run_gate: Callable) -> Callable:
+        """ Wraps a gate runner so that the gate runs are recorded. """
+
+        def run_profiled_gate(tag: Hashable, feed=None):
+            gate = network[tag]
+            gate.timings = {}
+            epoch = self._epoch
+            start_time = time.perf_counter()
+            try:
+                return run_gate(tag, feed)
+            finally:
+                end_time = time.perf_counter()
+                record = _GateRunRecord(tag, threading.get_ident(), epoch, start_time, end_time,
+                                        len(feed) if isinstance(feed, Sized) else None, gate.timings)
+                gate.timings = None
+                with self._lock:
+                    self.gate_records.append(record)
+
+        return run_profiled_gate
+
+    def to_chrome_trace(self) -> dict:
+        """ Exports the records as a Chrome trace event dictionary. """
+        origin = min([start_time for start_time, _ in self.epoch_records], default=0)
+        events = []
+        for epoch, (start_time, end_time) in enumerate(self.epoch_records):
+            events.append(_make_trace_event("epoch {}".format(epoch), "epoch", 0, start_time - origin,
+                                            end_time - start_time))
+        for record in self.gate_records:
+            events.append(_make_trace_event(str(record.tag), "gate", record.thread_id, record.start_time - origin,
+                                            record.end_time - record.start_time,
+                                            {"epoch": record.epoch, "feed_size": record.feed_size}))
+            for section, (start_time, end_time) in record.sections.items():
+                events.append(_make_trace_event(section, section, record.thread_id, start_time - origin,
+                                                end_time - start_time))
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def save_chrome_trace(self, file_path: str) -> None:
+        with open(file_path, "w") as file:
+            json.dump(self.to_chrome_trace(), file)
+
+    def get_summary(self) -> Dict[Hashable, Dict[str, float]]:
+        """ Aggregates the records per gate. Times are given in seconds.
+
+        :return: Maps the tag of each gate to its run count, total, mean and max run time, total procedure and
+            request time, and mean feed size.
+        """
+        summary = {}
+        for record in self.gate_records:
+            duration = record.end_time - record.start_time
+            gate_summary = summary.setdefault(record.tag, {
+                "count": 0, "total": 0.0, "max": 0.0, "procedure": 0.0, "request": 0.0, "feed_size": 0.0
+            })
+            gate_summary["count"] += 1
+            gate_summary["total"] += duration
+            gate_summary["max"] = max(gate_summary["max"], duration)
+            for section in ("procedure", "request"):
+                if section in record.sections:
+                    start_time, end_time = record.sections[section]
+                    gate_summary[section] += end_time - start_time
+            gate_summary["feed_size"] += record.feed_size or 0
+        for gate_summary in summary.values():
+            gate_summary["mean"] = gate_summary["total"] / gate_summary["count"]
+            gate_summary["feed_size"] /= gate_summary["count"]
+        return summary
+
+    def format_summary(self, sort_by: str = "total", limit: int = None) -> str:
+        """ Formats the summary as a table, sorted in descending order. Times are given in milliseconds. """
+        columns = ("count", "total", "mean", "max", "procedure", "request", "feed_size")
+        rows = sorted(self.get_summary().items(), key=lambda item: item[1][sort_by], reverse=True)[:limit]
+        lines = ["{:<24}".format("gate") + "".join("{:>12}".format(column) for column in columns)]
+        for tag, gate_summary in rows:
+            lines.append("{:<24}".format(str(tag)[:24]) + "".join(
+                "{:>12}".format(gate_summary[column]) if column == "count" else
+                "{:>12.1f}".format(gate_summary[column]) if column == "feed_size" else
+                "{:>12.3f}".format(gate_summary[column] * 1000) for column in columns))
+        return "\n".join(lines)
+
+
+def _make_trace_event(name: str, category: str, thread_id: int, start: float, duration: float,
+                      args: dict = None) -> dict:
+    # trace event times are given in microseconds
+    event = {"name": name, "cat": category, "ph": "X", "pid": 0, "tid": thread_id, "ts": start * 1e6,
+             "dur": duration * 1e6}
+    if args is not None:
+        event["args"] = args
+    return event
+
+
+class _GateTurnstile:
+    """ Makes sure that each gate handles the feeds of a stream one at a time and in the order of the feeds.
+
+    Feeds are identified by their (increasing) sequence number. A feed may only run a gate once every older feed that
+    is still in the network has run that gate itself, and no other feed is running it (which an older feed may still
+    do after passing the gate, in cyclic networks).
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._active = set()
+        # maps the tag of a gate to the sequences of the active feeds that have run the gate
+        self._passed: Dict[Hashable, set] = {}
+        # the tags of the gates that are being run
+        self._running = set()
+
+    def enter(self, sequence: int) -> None:
+        with self._condition:
+            self._active.add(sequence)
+
+    def exit(self, sequence: int) -> None:
+        with self._condition:
+            self._active.discard(sequence)
+            for passed in self._passed.values():
+                passed.discard(sequence)
+            self._condition.notify_all()
+
+    def run(self, sequence: int, tag: Hashable, func: Callable):
+        with self._condition:
+            passed = self._passed.setdefault(tag, set())
+            self._condition.wait_for(lambda: tag not in self._running and all(
+                other >= sequence or other in passed for other in self._active))
+            self._running.add(tag)
+        try:
+            return func()
+        finally:
+            with self._condition:
+                self._running.discard(tag)
+                passed.add(sequence)
+                self._condition.notify_all()
+
+
+class BatchResult(NamedTuple):
+    # the (sorted) indices of the batch rows that the columns are for
+    rows: np.ndarray
+    # the (nested) columns of the results, or a single column if the results aren't dictionaries
+    columns: Union[Dict[str, Any], np.ndarray]
+
+
+def _negate_evaluator(evaluator: Callable) -> Callable:
+    def negated_evaluator(a, b):
+        evaluation = evaluator(a, b)
+        # evaluations of whole batches are boolean masks
+        return np.logical_not(evaluation) if isinstance(evaluation, np.ndarray) else not evaluation
+
+    return negated_evaluator
+
+
+def _evaluate_batch_condition(condition: tuple, columns: dict, n: int) -> np.ndarray:
+    route, evaluator, target = condition
+    # as in a normal run, conditional edges are only followed from results that are dictionaries
+    values = get_nested_from_route(route, columns) if isinstance(columns, dict) else None
+    if values is None:
+        return np.zeros(n, dtype=bool)
+    try:
+        mask = evaluator(values, target)
+    except ValueError:
+        # the evaluator can't handle arrays
+        mask = None
+    if np.shape(mask) != (n,):
+        mask = [evaluator(value, target) for value in values]
+    return np.asarray(mask, dtype=bool)
+
+
+def _index_columns(columns, index: np.ndarray):
+    if isinstance(columns, dict):
+        return {key: _index_columns(column, index) for key, column in columns.items()}
+    return columns[index] if isinstance(columns, np.ndarray) else columns
+
+
+def _get_row(columns, i: int):
+    if isinstance(columns, dict):
+        return {key: _get_row(column, i) for key, column in columns.items()}
+    return columns[i] if isinstance(columns, np.ndarray) else columns
+
+
+def _stack_rows(rows: list):
+    # rows that are all dictionaries are stacked into (nested) columns, of which only the keys that every row has can
+    # be kept. any other rows are stacked into a single column.
+    if not rows:
+        return {}
+    if all(isinstance(row, dict) for row in rows):
+        keys = reduce(lambda a, b: a & b.keys(), rows[1:], rows[0].keys())
+        return {key: _stack_rows([row[key] for row in rows]) for key in keys}
+    try:
+        return np.array(rows)
+    except ValueError:
+        # the rows are arrays of different shapes
+        column = np.empty(len(rows), dtype=object)
+        for i, row in enumerate(rows):
+            column[i] = row
+        return column
+
+
+def _concatenate_batches(batches: List[BatchResult]) -> BatchResult:
+    if len(batches) == 1:
+        return batches[0]
+    # keep the rows sorted and unique. a row that reached the gate through several conditional parents is only kept
+    # once, with the columns of the first batch it is in.
+    rows, index = np.unique(np.concatenate([batch.rows for batch in batches]), return_index=True)
+    columns = _concatenate_columns([batch.columns for batch in batches], [len(batch.rows) for batch in batches], index)
+    return BatchResult(rows, {} if columns is None else columns)
+
+
+def _concatenate_columns(columns_of_batches: list, lengths: List[int], index: np.ndarray):
+    # only keep the columns that every batch has (None if the batches don't agree on whether a column is nested).
+    # columns that aren't arrays hold the same value for every row.
+    if all(isinstance(columns, dict) for columns in columns_of_batches):
+        keys = reduce(lambda a, b: a & b.keys(), columns_of_batches[1:], columns_of_batches[0].keys())
+        concatenated = {key: _concatenate_columns([columns[key] for columns in columns_of_batches], lengths, index)
+                        for key in keys}
+        return {key: column for key, column in concatenated.items() if column is not None}
+    if any(isinstance(columns, dict) for columns in columns_of_batches):
+        return None
+    columns_of_batches = [columns if isinstance(columns, np.ndarray) else
+                          np.broadcast_to(columns, (length,) + np.shape(columns))
+                          for columns, length in zip(columns_of_batches, lengths)]
+    try:
+        return np.concatenate(columns_of_batches)[index]
+    except ValueError:
+        # the rows of the batches have different shapes
+        return _stack_rows([row for columns in columns_of_batches for row in columns])[index]
+
+
+class _SharedArray(NamedTuple):
+    name: str
+    shape: tuple
+    dtype: str
+
+
+class _ProcessGate:
+    """ Stands in for a gate when its procedure runs in a process pool. Only the feed of the gate is available. """
+
+    def __init__(self, feed=None):
+        self.feed = feed
+
+
+# arrays smaller than this (in bytes) are cheaper to pickle than to pass through shared memory
+_shared_memory_threshold = 1 << 16
+
+
+def _share_arrays(obj, blocks: list):
+    # replace the large arrays in a (nested) feed by references to shared memory blocks that hold copies of them
+    if isinstance(obj, np.ndarray) and obj.nbytes >= _shared_memory_threshold:
+        block = shared_memory.SharedMemory(create=True, size=obj.nbytes)
+        blocks.append(block)
+        np.ndarray(obj.shape, obj.dtype, buffer=block.buf)[...] = obj
+        return _SharedArray(block.name, obj.shape, obj.dtype.str)
+    if isinstance(obj, dict):
+        return {key: _share_arrays(value, blocks) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [_share_arrays(value, blocks) for value in obj]
+    return obj
+
+
+def _attach_arrays(obj, blocks: list, arrays: list):
+    if isinstance(obj, _SharedArray):
+        block = shared_memory.SharedMemory(name=obj.name)
+        blocks.append(block)
+        array = np.ndarray(obj.shape, np.dtype(obj.dtype), buffer=block.buf)
+        arrays.append(array)
+        return array
+    if isinstance(obj, dict):
+        return {key: _attach_arrays(value, blocks, arrays) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [_attach_arrays(value, blocks, arrays) for value in obj]
+    return obj
+
+
+def _detach_arrays(obj, arrays: list):
+    # copy the arrays that are views of the shared memory, as the shared memory is released once the procedure is done
+    if isinstance(obj, np.ndarray) and any(np.may_share_memory(obj, array) for array in arrays):
+        return obj.copy()
+    if isinstance(obj, dict):
+        return {key: _detach_arrays(value, arrays) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_detach_arrays(value, arrays) for value in obj)
+    return obj
+
+
+def _run_procedure_in_process(procedure: Callable, takes_gate: bool, feed=None):
+    blocks, arrays = [], []
+    try:
+        gate = _ProcessGate(_attach_arrays(feed, blocks, arrays))
+        result = procedure(gate) if takes_gate else procedure()
+        return _detach_arrays(result, arrays)
+    finally:
+        gate = arrays = None
+        for block in blocks:
+            try:
+                block.close()
+            except BufferError:
+                # the procedure kept a reference to the shared memory, so leave it to be closed when it's collected
+                pass
+
+
+def _takes_gate(procedure: Callable) -> bool:
+    # the signatures of plain functions are read from their code directly, as inspecting them is slow enough to
+    # dominate building large networks.
+    if isinstance(procedure, FunctionType):
+        return procedure.__code__.co_argcount > len(procedure.__defaults__ or ())
+    return bool(get_required_args(procedure))
 
 
 class GateProcedureABC(ABC):
@@ -223,25 +1165,124 @@ class GateProcedureABC(ABC):
         pass
 
 
+@dataclass
+class _CachedHTTPResponse:
+    result: Any
+    etag: Union[str, None]
+    last_modified: Union[str, None]
+    expiry_time: float
+
+
 class HTTPRequesProcedure(GateProcedureABC):
+    """ HTTP request procedure.
+
+    Sends the feed of a gate as the data of an HTTP request and returns the formatted response. Procedures that
+    request the same host share a session, so that connections to the host are pooled and kept alive.
+
+    If caching is enabled, the formatted results of GET requests are cached per feed. A cached result is used as is
+    until it expires (according to the response's Cache-Control max-age) and is then revalidated with its ETag or
+    Last-Modified date. Error responses are neither formatted nor cached; they raise a requests.HTTPError instead.
+    """
     _http_method_handlers = {
-        "GET": lambda url, data: requests.get(url=url, params=data),
-        "POST": lambda url, data: requests.post(url=url, data=data)
+        "GET": lambda session, url, data, **kwargs: session.get(url=url, params=data, **kwargs),
+        "POST": lambda session, url, data, **kwargs: session.post(url=url, data=data, **kwargs)
     }
 
     _response_formatters = {
         "json": lambda response: response.json()
     }
 
-    def __init__(self, url: str, request_method: str = "GET", response_format: str = "json"):
+    # shared sessions keyed by the scheme and host they request
+    _sessions: Dict[str, requests.Session] = {}
+    _sessions_lock = threading.Lock()
+
+    def __init__(self, url: str, request_method: str = "GET", response_format: str = "json",
+                 timeout: Union[float, Tuple[float, float]] = 10.0, cache: bool = False, cache_size: int = 128,
+                 pool_size: int = 10):
+        """
+        :param url: The requested url.
+        :param request_method: The HTTP method used (GET or POST).
+        :param response_format: The format of the response.
+        :param timeout: The timeout (in seconds) of a request, or a (connect timeout, read timeout) tuple.
+        :param cache: If true, the responses of GET requests are cached.
+        :param cache_size: The maximum number of cached responses.
+        :param pool_size: The maximum number of connections kept alive to the host, if this procedure creates the
+            host's session.
+        """
         super().__init__()
         self._url = url
         self._method = request_method.upper().strip()
         self._format = response_format.lower().strip()
+        self._timeout = timeout
+        self._pool_size = pool_size
+        self._cache: Union[OrderedDict, None] = OrderedDict() if cache and self._method == "GET" else None
+        self._cache_size = cache_size
+        self._cache_lock = threading.Lock()
 
     def __call__(self, gate: Gate):
-        return self._response_formatters[self._format](self._http_method_handlers[self._method](
-            self._url, {} if gate.feed is None else gate.feed))
+        return self.request({} if gate.feed is None else gate.feed)
+
+    def request(self, data: dict = None):
+        data = {} if data is None else data
+        if self._cache is None:
+            return self._format_response(self._send(data))
+        try:
+            key = make_hashable(data)
+        except TypeError:
+            return self._format_response(self._send(data))
+        with self._cache_lock:
+            cached: Union[_CachedHTTPResponse, None] = self._cache.get(key, None)
+        headers = {}
+        if cached is not None:
+            if time.monotonic() < cached.expiry_time:
+                return cached.result
+            # the cached response expired, so check whether it is still valid
+            if cached.etag is not None:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified is not None:
+                headers["If-Modified-Since"] = cached.last_modified
+        response = self._send(data, headers)
+        if response.status_code == 304 and cached is not None:
+            cached.expiry_time = time.monotonic() + _get_max_age(response)
+            return cached.result
+        result = self._format_response(response)
+        if "no-store" not in response.headers.get("Cache-Control", ""):
+            with self._cache_lock:
+                self._cache[key] = _CachedHTTPResponse(result, response.headers.get("ETag", None),
+                                                       response.headers.get("Last-Modified", None),
+                                                       time.monotonic() + _get_max_age(response))
+                self._cache.move_to_end(key)
+                if len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+        return result
+
+    async def request_async(self, data: dict = None):
+        """ Asynchronous version of `request` that sends the request without blocking the event loop. """
+        return await asyncio.get_running_loop().run_in_executor(None, self.request, data)
+
+    def clear_cache(self) -> None:
+        if self._cache is not None:
+            with self._cache_lock:
+                self._cache.clear()
+
+    def _send(self, data: dict, headers: dict = None) -> requests.Response:
+        return self._http_method_handlers[self._method](
+            self._get_session(), self._url, data, headers=headers, timeout=self._timeout)
+
+    def _format_response(self, response: requests.Response):
+        response.raise_for_status()
+        return self._response_formatters[self._format](response)
+
+    def _get_session(self) -> requests.Session:
+        scheme, host, *_ = urlsplit(self._url)
+        session_key = "{}://{}".format(scheme, host)
+        with self._sessions_lock:
+            if session_key not in self._sessions:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self._pool_size)
+                session.mount(session_key, adapter)
+                self._sessions[session_key] = session
+            return self._sessions[session_key]
 
 
 class InjectionHandler(dict, GateProcedureABC):
@@ -249,3 +1290,11 @@ class InjectionHandler(dict, GateProcedureABC):
         result = {} if gate.feed is None else gate.feed
         result.update(self)
         return result
+
+
+def _get_max_age(response: requests.Response) -> float:
+    cache_control = response.headers.get("Cache-Control", "")
+    if "no-cache" in cache_control:
+        return 0
+    match = re.search(r"max-age=(\d+)", cache_control)
+    return int(match.group(1)) if match else 0
@@ -11,6 +11,7 @@ from typing import Hashable
 import numpy as np
 
 from ._utils import unit_vector
+from .connection import Response
 from .controller import ObserverMiddlewareABC
 from .plot import Plotter, PlotHandlerABC
 from .pose import PoseMiddleware
@@ -27,8 +28,18 @@ class MappingMiddleware(ObserverMiddlewareABC, list, PlotHandlerABC):
             "raycast": self.add_raycasted_measurement
         }
 
+    def handle(self, response: Response) -> None:
+        # place the measurements using the pose at the time they were made (see `PoseMiddleware.history`), which is
+        # only kept up to date if the pose middleware handles a response before this middleware does.
+        pose = None
+        for tag, parameter, observed_value in self._iter_observations(response):
+            if pose is None:
+                pose = self._pose.get_pose_at(response.local_sent_time)
+            self._measurement_handlers[parameter](np.array(pose.get_arm_absolute_position(tag)), pose.get_arm(tag),
+                                                  observed_value)
+
     def handle_observation(self, tag: Hashable, parameter: str, observed_value: float) -> None:
-        self._measurement_handlers[parameter](np.ndarray(self._pose.get_arm_absolute_position(tag)),
+        self._measurement_handlers[parameter](np.array(self._pose.get_arm_absolute_position(tag)),
                                               self._pose.arms[tag], observed_value)
 
     def add_raycasted_measurement(self, position: np.ndarray, arm: np.ndarray, distance: float) -> None:
@@ -32,7 +32,7 @@ class _PointNode(set):
         self.settings = intersect_update(_default_point_settings, {} if settings is None else settings)
 
 
-class Plotter(dict):
+class Plotter(_graph.IndexedGraph):
     def __init__(self, canvas_size: Tuple[int, int] = (600, 500),
                  space_size: Tuple[int, int, int] = (200, 200, 200), show_axes: bool = True,
                  show_floor_grid: bool = True, viewing_angle: float = math.pi / 6, viewing_scale: float = 1):
@@ -5,27 +5,46 @@
 
 import json
 import math
+import threading
 from collections.abc import Hashable
-from typing import Dict, Tuple, Iterable
+from dataclasses import dataclass
+from typing import Dict, Tuple, Iterable, List, Union, Any
 
 import numpy as np
 
 from . import _graph
 from ._utils import get_x_rotation_matrix, get_z_rotation_matrix, get_y_rotation_matrix, unit_vector
+from .connection import Response
 from .controller import ObserverMiddlewareABC
 from .plot import Plotter, PlotHandlerABC
 
 
-class PoseMiddleware(ObserverMiddlewareABC, dict, PlotHandlerABC):
+class PoseMiddleware(ObserverMiddlewareABC, _graph.IndexedGraph, PlotHandlerABC):
     def __init__(self, arm_details: Dict[Hashable, Tuple[float, float, float]] = None,
                  joints: Iterable[Tuple[str, str]] = None, in_degrees: bool = True,
                  reference_position: Iterable[float] = (0, 0, 0),
-                 reference_orientation_angles: Tuple[float, float, float] = (0, 0, 0)):
+                 reference_orientation_angles: Tuple[float, float, float] = (0, 0, 0),
+                 history_capacity: int = None):
         super().__init__()
+        # the arm vectors are rows of a single array, and each arm in `arms` is a view of its row. This way arms can
+        # be changed in place one at a time, while the kinematics work on all of them at once.
         self.arms: Dict[Hashable, np.ndarray] = {}
         self.reference_orientation_angles: Tuple[float, float, float] = reference_orientation_angles
         self.reference_position = np.array(reference_position)
         self._in_degrees = in_degrees
+        self._arm_array = np.zeros((_initial_arm_capacity, 3))
+        self._rows: Dict[Hashable, int] = {}
+        self._row_tags: List[Hashable] = []
+        self._kinematics: Union[_Kinematics, None] = None
+        # the rotation is cached along with the orientation angles it was built from
+        self._rotation_angles: Union[Tuple[float, float, float], None] = None
+        self._rotation: Union[np.ndarray, None] = None
+        # the absolute positions (rows of the arms) are cached along with the state they were computed from, so that
+        # changes made to the arms directly are picked up as well.
+        self._positions: Union[np.ndarray, None] = None
+        self._positions_state: Union[tuple, None] = None
+        # if set, the pose after each handled response is kept in the history (see `get_arm_absolute_position_at`)
+        self.history: Union[PoseHistory, None] = None if history_capacity is None else PoseHistory(history_capacity)
         if arm_details:
             self.add_arms_from_dict(arm_details)
         if joints:
@@ -33,8 +52,14 @@ class PoseMiddleware(ObserverMiddlewareABC, dict, PlotHandlerABC):
 
     @property
     def orientation(self) -> np.ndarray:
-        x_angle, y_angle, z_angle = self.reference_orientation_angles
-        return get_x_rotation_matrix(x_angle) * get_y_rotation_matrix(y_angle) * get_z_rotation_matrix(z_angle)
+        angles = tuple(self.reference_orientation_angles)
+        if angles != self._rotation_angles:
+            x_angle, y_angle, z_angle = angles
+            rotation = get_x_rotation_matrix(x_angle) @ get_y_rotation_matrix(y_angle) @ get_z_rotation_matrix(z_angle)
+            # the rotation is shared by every caller, so make sure it isn't changed by one of them
+            rotation.setflags(write=False)
+            self._rotation_angles, self._rotation = angles, rotation
+        return self._rotation
 
     def setup_from_json_file(self, file_path: str) -> None:
         with open(file_path, "r") as file:
@@ -47,20 +72,73 @@ class PoseMiddleware(ObserverMiddlewareABC, dict, PlotHandlerABC):
             if field in saved_data:
                 handler(saved_data[field])
 
+    def handle(self, response: Response) -> None:
+        self.handle_observations(self._iter_observations(response))
+        if self.history is not None:
+            # the observations were made around the time the worker sent the response
+            self.history.append(response.local_sent_time, self._get_absolute_positions(),
+                                self._arm_array[:len(self._row_tags)])
+
     def handle_observation(self, tag: Hashable, parameter: str, observed_value: float) -> None:
         value = math.radians(observed_value) if parameter in _angle_parameters and self._in_degrees else observed_value
         _arm_setters[parameter](self.arms[tag], value)
 
+    def handle_observations(self, observations: Iterable[Tuple[Hashable, str, Any]]) -> None:
+        """ Applies many observations at once, which gives the same result as handling them one at a time.
+
+        The observations are split into stages, where the nth stage holds the nth observation of each arm, so an arm
+        is updated in the order of its observations. Within a stage, the observations of each parameter are applied
+        to all of the arms they observe in one operation on the arm array.
+
+        :param observations: (tag, parameter, observed value) observations.
+        :return: None.
+        """
+        stages: List[Dict[str, Tuple[list, list]]] = []
+        counts: Dict[Hashable, int] = {}
+        for tag, parameter, observed_value in observations:
+            stage = counts.get(tag, 0)
+            counts[tag] = stage + 1
+            if stage == len(stages):
+                stages.append({})
+            rows, values = stages[stage].setdefault(parameter, ([], []))
+            rows.append(self._rows[tag])
+            values.append(observed_value)
+        for stage in stages:
+            for parameter, (rows, values) in stage.items():
+                values = np.array(values, dtype=float)
+                if parameter in _angle_parameters and self._in_degrees:
+                    values = np.radians(values)
+                _batch_arm_setters[parameter](self._arm_array, np.array(rows, dtype=np.intp), values)
+
     def add_arm(self, tag: Hashable, x: float, y: float, z: float) -> None:
         if x == y == z == 0:
             raise ValueError("All arm components can't be 0")
         _graph.add_node(self, tag)
-        self.arms[tag] = np.array([x, y, z])
+        row = self._rows.get(tag, None)
+        if row is None:
+            row = self._rows[tag] = len(self._row_tags)
+            self._row_tags.append(tag)
+            if row == len(self._arm_array):
+                self._resize_arm_array(2 * len(self._arm_array))
+            # the poses in the history don't have the new arm
+            self._clear_history()
+        self._arm_array[row] = x, y, z
+        self.arms[tag] = self._arm_array[row]
+        self._kinematics = None
 
     def remove_arm(self, tag: Hashable) -> None:
         _graph.remove_node(self, tag)
         if tag in self.arms:
             del self.arms[tag]
+            # move the last row into the removed arm's row to keep the rows packed
+            row, last_tag = self._rows.pop(tag), self._row_tags.pop()
+            if last_tag != tag:
+                self._arm_array[row] = self._arm_array[len(self._row_tags)]
+                self._row_tags[row] = last_tag
+                self._rows[last_tag] = row
+                self.arms[last_tag] = self._arm_array[row]
+            self._clear_history()
+        self._kinematics = None
 
     def add_arms_from_dict(self, arm_details: Dict[Hashable, Tuple[float, float, float]]) -> None:
         for tag, coordinates in arm_details.items():
@@ -71,9 +149,12 @@ class PoseMiddleware(ObserverMiddlewareABC, dict, PlotHandlerABC):
         return _arm_getters[state_type](self.arms[tag])
 
     def join_arms(self, from_tag: Hashable, to_tag: Hashable) -> None:
-        _graph.add_edge(self, from_tag, to_tag)
-        if not _graph.is_acyclic(self):
+        # the joint closes a cycle if its first arm can already be reached from its second arm. This only searches
+        # around the two arms, whereas checking the whole model would make joining many arms quadratic.
+        if to_tag in self and from_tag != to_tag and _graph.is_reachable(self, to_tag, from_tag):
             raise RuntimeError("The joint '{}' to '{}' creates a cycle in the body's model.".format(from_tag, to_tag))
+        _graph.add_edge(self, from_tag, to_tag)
+        self._kinematics = None
 
     def add_joints_from_iterable(self, joints: Iterable[Tuple[str, str]]) -> None:
         for from_tag, to_tag in joints:
@@ -81,22 +162,45 @@ class PoseMiddleware(ObserverMiddlewareABC, dict, PlotHandlerABC):
 
     def remove_joint(self, from_tag: Hashable, to_tag: Hashable) -> None:
         _graph.remove_edge(self, from_tag, to_tag)
+        self._kinematics = None
 
     def set_reference_position(self, x: float, y: float, z: float) -> None:
         self.reference_position = np.array([x, y, z])
 
     def set_orientation_angles(self, x_angle: float = None, y_angle: float = None, z_angle: float = None) -> None:
         current_x_angle, current_y_angle, current_z_angle = self.reference_orientation_angles
-        self.reference_position = \
+        self.reference_orientation_angles = \
             current_x_angle if x_angle is None else x_angle, \
             current_y_angle if y_angle is None else y_angle, \
             current_z_angle if z_angle is None else z_angle
 
     def get_arm_absolute_position(self, tag: Hashable) -> Tuple[float, float, float]:
-        return tuple(self.orientation.dot(self._get_arm_absolute_position_util(tag, self.reference_position.copy())))
+        return tuple(self._get_absolute_positions()[self._rows[tag]])
 
     def get_all_arm_absolute_positions(self) -> Dict[Hashable, Tuple[float, float, float]]:
-        return {tag: self.get_arm_absolute_position(tag) for tag in self.keys()}
+        positions = self._get_absolute_positions()
+        return {tag: tuple(positions[self._rows[tag]]) for tag in self.keys()}
+
+    def get_arm_absolute_position_at(self, tag: Hashable, timestamp: float) -> Tuple[float, float, float]:
+        """ Gets the absolute position an arm had at a (controller) time, interpolated from the pose history. If there
+        is no history, the current position is returned instead.
+        """
+        return self.get_pose_at(timestamp).get_arm_absolute_position(tag)
+
+    def get_arm_at(self, tag: Hashable, timestamp: float) -> np.ndarray:
+        """ Gets the vector an arm had at a (controller) time, interpolated from the pose history. If there is no
+        history, the current vector is returned instead.
+        """
+        return self.get_pose_at(timestamp).get_arm(tag)
+
+    def get_pose_at(self, timestamp: float) -> "Pose":
+        """ Gets the pose at a (controller) time, interpolated from the pose history. If there is no history, the
+        current pose is returned instead. Look the pose up once to get several of its arms.
+        """
+        pose = self.history.get_at(timestamp) if self.history is not None else None
+        if pose is None:
+            pose = self._get_absolute_positions(), self._arm_array[:len(self._row_tags)].copy()
+        return Pose(pose[0], pose[1], dict(self._rows))
 
     def add_to_plot(self, plot: Plotter) -> None:
         fig_fill = "#0F0"
@@ -110,12 +214,162 @@ class PoseMiddleware(ObserverMiddlewareABC, dict, PlotHandlerABC):
         for from_tag, to_tag in edges:
             plot.add_edge(from_tag, to_tag, fill=fig_fill)
 
-    def _get_arm_absolute_position_util(self, tag: Hashable, reference: np.ndarray) -> np.ndarray:
-        parents = _graph.get_in_neighbors(self, tag)
-        abs_position = self.arms[tag].copy() + reference
-        if not parents:
-            return abs_position
-        return self._get_arm_absolute_position_util(parents.pop(), abs_position)
+    def _clear_history(self) -> None:
+        if self.history is not None:
+            self.history.clear()
+
+    def _resize_arm_array(self, capacity: int) -> None:
+        arm_array = np.zeros((capacity, 3))
+        arm_array[:len(self._arm_array)] = self._arm_array
+        self._arm_array = arm_array
+        # the arms have to be views of the new array
+        for tag in self.arms:
+            self.arms[tag] = arm_array[self._rows[tag]]
+
+    def _get_kinematics(self) -> "_Kinematics":
+        if self._kinematics is None:
+            # the absolute position of an arm is its parent's absolute position plus the arm, so the positions can be
+            # computed a whole generation (arms at the same depth) at a time, in topological order.
+            depths, generations = {}, []
+            for tag in _graph.get_topological_order(self):
+                parent = next(iter(_graph.get_in_neighbors(self, tag)), None)
+                depth = depths[tag] = 0 if parent is None else depths[parent] + 1
+                if depth == len(generations):
+                    generations.append(([], []))
+                rows, parent_rows = generations[depth]
+                rows.append(self._rows[tag])
+                parent_rows.append(None if parent is None else self._rows[parent])
+            self._kinematics = _Kinematics([(np.array(rows, dtype=np.intp), np.array(parent_rows, dtype=np.intp))
+                                            for rows, parent_rows in generations[1:]],
+                                           np.array(generations[0][0] if generations else [], dtype=np.intp))
+            self._positions = None
+        return self._kinematics
+
+    def _get_absolute_positions(self) -> np.ndarray:
+        """ Gets the absolute positions of the arms as rows of an array (see `_rows`). """
+        kinematics = self._get_kinematics()
+        arm_array = self._arm_array[:len(self._row_tags)]
+        rotation = self.orientation
+        state = self._positions_state
+        if self._positions is None or state[0] is not rotation or not np.array_equal(state[1], arm_array) \
+                or not np.array_equal(state[2], self.reference_position):
+            positions = np.empty_like(arm_array)
+            positions[kinematics.root_rows] = arm_array[kinematics.root_rows] + self.reference_position
+            for rows, parent_rows in kinematics.generations:
+                positions[rows] = arm_array[rows] + positions[parent_rows]
+            # rotate all of the positions at once
+            self._positions = positions @ rotation.T
+            self._positions_state = rotation, arm_array.copy(), np.array(self.reference_position)
+        return self._positions
+
+
+@dataclass
+class Pose:
+    """ The absolute positions and vectors of the arms at some time (see `PoseMiddleware.get_pose_at`). """
+    # the positions and vectors of the arms are rows of these arrays, where rows maps the tag of an arm to its row
+    positions: np.ndarray
+    arms: np.ndarray
+    rows: Dict[Hashable, int]
+
+    def get_arm_absolute_position(self, tag: Hashable) -> Tuple[float, float, float]:
+        return tuple(self.positions[self.rows[tag]])
+
+    def get_arm(self, tag: Hashable) -> np.ndarray:
+        return self.arms[self.rows[tag]]
+
+
+class PoseHistory:
+    """ Pose history.
+
+    A fixed-capacity ring buffer of timestamped poses, where a pose is the absolute positions and the vectors of the
+    arms (as rows of arrays). Once the buffer is full, the oldest pose is overwritten. Poses are looked up by time
+    with a binary search and interpolated linearly between the poses before and after that time.
+
+    A history can be appended to and read from different threads (e.g. by middleware in a `MiddlewarePipeline`).
+    Poses are copied into and out of the history, so callers never share its arrays.
+    """
+
+    def __init__(self, capacity: int):
+        if capacity < 1:
+            raise ValueError("The capacity of a pose history can't be less than 1.")
+        self.capacity = capacity
+        self._timestamps = np.zeros(capacity)
+        self._positions: Union[np.ndarray, None] = None
+        self._arms: Union[np.ndarray, None] = None
+        # the index of the oldest pose and the number of poses
+        self._start = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def clear(self) -> None:
+        with self._lock:
+            self._positions = self._arms = None
+            self._start = self._count = 0
+
+    def append(self, timestamp: float, positions: np.ndarray, arms: np.ndarray) -> None:
+        """ Adds a pose. Poses older than the latest pose are ignored, so that the history stays sorted by time.
+
+        :param timestamp: The time of the pose.
+        :param positions: The absolute positions of the arms.
+        :param arms: The vectors of the arms.
+        :return: None.
+        """
+        with self._lock:
+            if self._count and timestamp < self._timestamps[self._get_index(self._count - 1)]:
+                return
+            if self._positions is None or self._positions.shape[1:] != positions.shape:
+                self._positions = np.zeros((self.capacity,) + positions.shape)
+                self._arms = np.zeros((self.capacity,) + arms.shape)
+                self._start = self._count = 0
+            if self._count < self.capacity:
+                index = self._get_index(self._count)
+                self._count += 1
+            else:
+                index = self._start
+                self._start = (self._start + 1) % self.capacity
+            self._timestamps[index] = timestamp
+            self._positions[index] = positions
+            self._arms[index] = arms
+
+    def get_at(self, timestamp: float) -> Union[Tuple[np.ndarray, np.ndarray], None]:
+        """ Gets the (absolute positions, arm vectors) pose at a time. Times outside of the history get the oldest or
+        the latest pose.
+
+        :param timestamp: The time.
+        :return: The pose or None if the history is empty.
+        """
+        with self._lock:
+            if not self._count:
+                return None
+            # find the first pose after the time
+            low, high = 0, self._count
+            while low < high:
+                middle = (low + high) // 2
+                if self._timestamps[self._get_index(middle)] <= timestamp:
+                    low = middle + 1
+                else:
+                    high = middle
+            if low == 0 or low == self._count:
+                index = self._get_index(0 if low == 0 else self._count - 1)
+                return self._positions[index].copy(), self._arms[index].copy()
+            before, after = self._get_index(low - 1), self._get_index(low)
+            start_time, end_time = self._timestamps[before], self._timestamps[after]
+            fraction = (timestamp - start_time) / (end_time - start_time)
+            return (self._positions[before] + (self._positions[after] - self._positions[before]) * fraction,
+                    self._arms[before] + (self._arms[after] - self._arms[before]) * fraction)
+
+    def _get_index(self, i: int) -> int:
+        return (self._start + i) % self.capacity
+
+
+@dataclass
+class _Kinematics:
+    # (rows, parent rows) of the arms at each depth below the roots, in order of depth
+    generations: List[Tuple[np.ndarray, np.ndarray]]
+    root_rows: np.ndarray
 
 
 def cartesian_to_spherical(x: float, y: float, z: float) -> tuple:
@@ -156,6 +410,50 @@ _arm_setters = {
     "len": lambda v, value: v.put([0, 1, 2], unit_vector(v) * value)
 }
 
+
+def _cartesian_to_spherical_rows(v: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # the same as `cartesian_to_spherical` for each row of an array
+    x, y, z = v.T
+    radius = np.linalg.norm(v, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        azimuthal = np.arctan(y / x)
+        polar = np.arccos(np.round(z / radius, 5))
+    # zero vectors have no direction, and vectors along the z-axis have no azimuthal angle
+    azimuthal[np.isnan(azimuthal) | (radius == 0)] = 0
+    polar[radius == 0] = 0
+    return radius, polar, azimuthal
+
+
+def _spherical_to_cartesian_rows(radius: np.ndarray, polar: np.ndarray, azimuthal: np.ndarray) -> np.ndarray:
+    return np.column_stack((radius * np.sin(polar) * np.cos(azimuthal), radius * np.sin(polar) * np.sin(azimuthal),
+                            radius * np.cos(polar)))
+
+
+def _set_arms_yaw(arms: np.ndarray, rows: np.ndarray, angles: np.ndarray) -> None:
+    radius, polar, azimuthal = _cartesian_to_spherical_rows(arms[rows])
+    arms[rows] = _spherical_to_cartesian_rows(radius, angles, azimuthal)
+
+
+def _set_arms_pitch(arms: np.ndarray, rows: np.ndarray, angles: np.ndarray) -> None:
+    radius, polar, azimuthal = _cartesian_to_spherical_rows(arms[rows])
+    arms[rows] = _spherical_to_cartesian_rows(radius, polar, angles)
+
+
+def _set_arms_length(arms: np.ndarray, rows: np.ndarray, lengths: np.ndarray) -> None:
+    v = arms[rows]
+    arms[rows] = v / np.linalg.norm(v, axis=1)[:, np.newaxis] * lengths[:, np.newaxis]
+
+
+# the arm setters for many arms (rows of the arm array) at once
+_batch_arm_setters = {
+    "pos_x": lambda arms, rows, values: arms.__setitem__((rows, 0), values),
+    "pos_y": lambda arms, rows, values: arms.__setitem__((rows, 1), values),
+    "pos_z": lambda arms, rows, values: arms.__setitem__((rows, 2), values),
+    "yaw": _set_arms_yaw,
+    "pitch": _set_arms_pitch,
+    "len": _set_arms_length
+}
+
 _arm_getters = {
     "pos_x": lambda v: v[0],
     "pos_y": lambda v: v[1],
@@ -167,5 +465,8 @@ _arm_getters = {
 
 _angle_parameters = {"yaw", "pitch"}
 
+_initial_arm_capacity = 8
+
 # make sure that every arm getter has a setter
-assert _arm_setters.keys() == _arm_getters.keys(), "Arm setters don't match arm getters."
+assert _arm_setters.keys() == _arm_getters.keys() == _batch_arm_setters.keys(), \
+    "Arm setters don't match arm getters."
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+""" Response recording and replay.
+
+A response recorder is a middleware that appends every response received by a controller to a session log, so that
+the session can later be replayed by a response replayer without any hardware. Replaying a session drives middleware
+(and anything built on top of them) with the recorded responses, either as fast as possible or at the original timing.
+
+Session log format:
+~~~~~~~~~~~~~~~~~~~
+A session is stored as two append-only files:
+    - the log file, which holds each response as a msgpack encoded frame, and
+    - the index file (the log file path with an '.idx' suffix), which holds the byte offset and length of each
+      frame in the log file as a pair of little-endian unsigned 64-bit integers.
+
+A frame is only indexed once it has been completely written, so anything past the last indexed frame (e.g. a frame
+torn by a crash) is ignored by the replayer and discarded by the recorder when it reopens the session.
+
+"""
+
+import mmap
+import os
+import struct
+import time
+from dataclasses import asdict
+from typing import Iterable, Iterator
+
+import numpy as np
+
+from .connection import Response, encode_transaction, decode_response
+from .controller import MiddlewareABC
+
+_index_suffix = ".idx"
+_index_format = "<QQ"
+_index_record_size = struct.calcsize(_index_format)
+
+
+class ResponseRecorder(MiddlewareABC):
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._log = open(file_path, "ab")
+        self._index = open(_get_index_path(file_path), "ab")
+        # drop any torn frame (or index record) left behind by an interrupted session before appending to it.
+        frames = _read_frames(file_path, os.fstat(self._log.fileno()).st_size)
+        for file, size in ((self._log, int(frames[-1].sum()) if len(frames) else 0),
+                           (self._index, len(frames) * _index_record_size)):
+            file.truncate(size)
+            file.seek(size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def handle(self, response: Response) -> None:
+        offset = self._log.tell()
+        frame = encode_transaction(asdict(response))
+        self._log.write(frame)
+        self._log.flush()
+        # only index the frame once it is written, so that the index never points to an incomplete frame.
+        self._index.write(struct.pack(_index_format, offset, len(frame)))
+        self._index.flush()
+
+    def close(self) -> None:
+        self._log.close()
+        self._index.close()
+
+
+class ResponseReplayer:
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        with open(file_path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            # an empty file can't be memory-mapped
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self._frames: np.ndarray = _read_frames(file_path, size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def __getitem__(self, i: int) -> Response:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("Response index out of range.")
+        start, length = (int(value) for value in self._frames[i])
+        return decode_response(self._map[start:start + length])
+
+    def __iter__(self) -> Iterator[Response]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def replay(self, middleware: Iterable[MiddlewareABC], realtime: bool = False, speed: float = 1.0) -> int:
+        """ Passes the recorded responses through the given middleware.
+
+        :param middleware: The middleware that should handle the recorded responses.
+        :param realtime: If true, the responses are replayed at the timing they were originally received at.
+            Otherwise, they are replayed as fast as possible.
+        :param speed: Speeds up (or slows down) the replay when replaying at the original timing.
+        :return: The number of replayed responses.
+        """
+        middleware = list(middleware)
+        first_received_time = start_time = None
+        count = 0
+        for response in self:
+            if realtime:
+                if first_received_time is None:
+                    first_received_time, start_time = response.received_time, time.perf_counter()
+                delay = (response.received_time - first_received_time) / speed - (time.perf_counter() - start_time)
+                if delay > 0:
+                    time.sleep(delay)
+            for obj in middleware:
+                obj.handle(response)
+            count += 1
+        return count
+
+    def close(self) -> None:
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+
+
+def _get_index_path(file_path: str) -> str:
+    return file_path + _index_suffix
+
+
+def _read_frames(file_path: str, size: int) -> np.ndarray:
+    """ Reads the (offset, length) records of the frames that are completely contained in the first size bytes of
+    a log file, ignoring a trailing partially written index record.
+    """
+    try:
+        with open(_get_index_path(file_path), "rb") as file:
+            data = file.read()
+    except FileNotFoundError:
+        data = b""
+    count = len(data) // _index_record_size
+    frames = np.frombuffer(data, dtype="<u8", count=2 * count).reshape(count, 2)
+    # frames are appended in order, so their ends are sorted
+    return frames[:np.searchsorted(frames.sum(axis=1), size, side="right")]
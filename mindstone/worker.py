@@ -20,6 +20,7 @@ Module Structure:
 
 import threading
 import time
+from collections import deque
 from abc import ABC, abstractmethod
 from typing import Dict, Callable, Any, Union
 
@@ -27,40 +28,61 @@ from ._utils import intersect_update, get_required_args, get_args, inner_merge,
 from .connection import server_types, decode_request, encode_transaction, WorkerABC
 
 _error_messages = {
-    "component_not_found": "Component '{}' could not be found."
+    "component_not_found": "Component '{}' could not be found.",
+    "prepared_not_found": "Prepared request '{}' could not be found.",
+    "not_an_input_pin": "Component '{}' is not an input pin."
 }
 
+# the results of these (method, resource) handlers are feedback dictionaries of their own and are merged directly into
+# the response instead of being nested under their method and resource.
+_inline_feedback_handlers = {("execute", "prepared")}
+
 
 # Worker
 # ~~~~~~
 class Worker(WorkerABC):
-    def __init__(self):
+    def __init__(self, max_buffered_events: int = 1000):
         self.method_handlers = {
             "add": {
                 "component": self.add_component,
                 "routine": self.add_routine,
-                "platform": self.add_platform
+                "platform": self.add_platform,
+                "event": self.add_event
             },
             "remove": {
                 "component": self.remove_component,
                 "routine": self.remove_routine,
-                "platform": self.remove_platform
+                "platform": self.remove_platform,
+                "prepared": self.remove_prepared,
+                "event": self.remove_event
             },
             "execute": {
-                "component": self.execute_component
+                "component": self.execute_component,
+                "prepared": self.execute_prepared
+            },
+            "prepare": {
+                "request": self.prepare_request
             },
             "get": {
                 "observations": self.get_observations,
                 # make sure that get handler callees return list types otherwise there will
                 # be issues encoding the data
                 "components": self.get_components,
-                "routines": self.get_routines
+                "routines": self.get_routines,
+                "capabilities": self.get_capabilities
             }
         }
 
         self._platform: Union[PlatformABC, None] = None
         self._routines_active = False
         self._routines = {}
+        # stores request plans of the form [(method, resource, handler, kwargs), ...] where the handler is resolved
+        # when the request is prepared rather than every time it is executed.
+        self._prepared_requests: Dict[str, list] = {}
+        # edge events detected on input pins are buffered as (component key, edge, timestamp) entries until they are
+        # delivered with the next response. If the buffer is full, the oldest events are discarded.
+        self._events = deque(maxlen=max_buffered_events)
+        self._event_subscriptions = set()
         self._routines_thread = threading.Thread(target=self._run_routines)
 
     def add_platform(self, type: str) -> None:
@@ -68,9 +90,12 @@ class Worker(WorkerABC):
         :param type: The type label for a specific platform.
         :return: None.
         """
-        self._platform = platform_types[type]()
+        platform = platform_types[type]()
+        self._clear_events()
+        self._platform = platform
 
     def remove_platform(self) -> None:
+        self._clear_events()
         self._platform = None
 
     def add_routine(self, key: str, interval: float, executor: str, operation: str,
@@ -91,6 +116,7 @@ class Worker(WorkerABC):
         self._platform.add_component(key, type, **setup)
 
     def remove_component(self, key: str) -> None:
+        self.remove_event(key)
         self._platform.remove_component(key)
 
     def execute_component(self, key: str, operation: str, kwargs: dict = None) -> None:
@@ -101,6 +127,77 @@ class Worker(WorkerABC):
         # call the component function
         getattr(self._platform[key], operation)(**kwargs)
 
+    def add_event(self, key: str, edge_type: str = "both", bounce_time: int = None) -> None:
+        """ Subscribes to the edge events of an input pin component. Detected events are timestamped when they occur
+        and delivered with the next response.
+
+        :param key: The key of the input pin component.
+        :param edge_type: The type of edge to detect (rising, falling or both).
+        :param bounce_time: Switch bounce time (in milliseconds) during which further edges are ignored.
+        :return: None.
+        """
+        pin = self._get_input_pin(key)
+        if edge_type not in pin.edge_types:
+            raise RuntimeError("Edge type '{}' is invalid. Try: {}".format(edge_type, ", ".join(pin.edge_types)))
+        # replace any existing subscription on the pin
+        self.remove_event(key)
+
+        def on_edge(*args) -> None:
+            # take the timestamp before anything else so that it is as close as possible to the edge itself
+            timestamp = time.time()
+            # only a "both" subscription needs the pin level to tell the edges apart; reading it for a single edge
+            # type would mislabel short pulses that have already settled back by the time the callback runs
+            edge = edge_type if edge_type != "both" else ("rising" if pin.value() else "falling")
+            self._events.append((key, edge, timestamp))
+
+        pin.event(pin.edge_types[edge_type], callback=on_edge, bounce_time=bounce_time)
+        self._event_subscriptions.add(key)
+
+    def remove_event(self, key: str) -> None:
+        if key in self._event_subscriptions:
+            self._get_input_pin(key).remove_event()
+            self._event_subscriptions.remove(key)
+
+    def prepare_request(self, key: str, items: list) -> str:
+        """ Registers a request template that can later be executed by only sending its key.
+
+        :param key: The key (handle) given to the prepared request.
+        :param items: List of (method, resource, kwargs) request items.
+        :return: The key of the prepared request.
+        """
+        plan = []
+        for method, resource, kwargs in items:
+            if (method, resource) in _inline_feedback_handlers:
+                raise RuntimeError("Prepared requests can't contain other prepared requests.")
+            plan.append((method, resource, self._get_method_handler(method, resource), kwargs))
+        self._prepared_requests[key] = plan
+        return key
+
+    def remove_prepared(self, key: str) -> None:
+        if key in self._prepared_requests:
+            del self._prepared_requests[key]
+
+    def execute_prepared(self, key: str, parameters: list = None) -> dict:
+        """ Executes a prepared request.
+
+        :param key: The key of the prepared request.
+        :param parameters: List of [index, kwargs] pairs that update the keyword arguments of the item at the given
+            index of the prepared request. Dictionary arguments are updated rather than replaced.
+        :return: The feedback of the executed items.
+        """
+        if key not in self._prepared_requests:
+            raise RuntimeError(_error_messages["prepared_not_found"].format(key))
+        updates = {index: kwargs for index, kwargs in parameters} if parameters else {}
+        feedback = {}
+        for index, (method, resource, handler, kwargs) in enumerate(self._prepared_requests[key]):
+            if index in updates:
+                kwargs = _update_kwargs(kwargs, updates[index])
+            # noinspection PyNoneFunctionAssignment
+            result = handler(**kwargs)
+            if result is not None:
+                inner_merge(feedback, method, {resource: result})
+        return feedback
+
     def get_observations(self, selected: list = None) -> dict:
         to_read_from: set = set(selected) if selected else self._platform.keys()
         return {tag: component.read() for tag, component in self._platform.items()
@@ -112,6 +209,12 @@ class Worker(WorkerABC):
     def get_routines(self) -> list:
         return list(self._routines)
 
+    def get_capabilities(self) -> dict:
+        # sets can't be encoded, so convert them to lists
+        return {platform_key: {component_label: list(required_args) for component_label, required_args in
+                               component_types.items()}
+                for platform_key, component_types in get_capabilities().items()}
+
     def serve(self, hostname: str = "", port: int = 50000, connection_type: str = "tcp") -> None:
         # start the routines thread
         self._routines_thread.start()
@@ -141,6 +244,9 @@ class Worker(WorkerABC):
             # controller instead of terminating the driver.
             feedback_to_send["error"] = "{}: {}".format(e.__class__.__name__, str(e))
             print(TerminalColors.FAIL + "\t!!! " + feedback_to_send["error"] + TerminalColors.ENDC)
+        # ~ deliver any edge events that were detected since the last response.
+        if self._events:
+            feedback_to_send["events"] = self._pop_events()
         # ~ prepare the message to be sent
         feedback_to_send["sent_time"] = time.time()
         print(TerminalColors.OKGREEN + "[{}] RESPONSE SENT".format(
@@ -155,15 +261,42 @@ class Worker(WorkerABC):
             print("\tHANDLED METHOD '{}'".format(TerminalColors.OKBLUE + method + TerminalColors.ENDC))
             # display the keyword args as a list
             print("".join("\t\t" + "{}: {}\n".format(*item) for item in kwargs.items()).strip("\n"))
-            if method not in self.method_handlers:
-                raise RuntimeError("Received method '{}' is invalid. Try: {}".format(
-                    method, ", ".join(self.method_handlers)))
             # noinspection PyNoneFunctionAssignment
-            result = self.method_handlers[method][resource](**kwargs)
-            if result is not None:
+            result = self._get_method_handler(method, resource)(**kwargs)
+            if (method, resource) in _inline_feedback_handlers:
+                for result_method, result_resources in result.items():
+                    inner_merge(response, result_method, result_resources)
+            elif result is not None:
                 inner_merge(response, method, {resource: result})
         return response
 
+    def _get_input_pin(self, key: str) -> "InputPinABC":
+        if key not in self._platform:
+            raise RuntimeError(_error_messages["component_not_found"].format(key))
+        if not isinstance(self._platform[key], InputPinABC):
+            raise RuntimeError(_error_messages["not_an_input_pin"].format(key))
+        return self._platform[key]
+
+    def _clear_events(self) -> None:
+        # unsubscribe from the edge events of the current platform's pins before dropping the events they detected,
+        # so that no callback adds an event for a component that no longer exists.
+        for key in list(self._event_subscriptions):
+            self.remove_event(key)
+        self._events.clear()
+
+    def _pop_events(self) -> list:
+        # only pop the events that are currently buffered as the pin callbacks may add more while popping
+        return [list(self._events.popleft()) for _ in range(len(self._events))]
+
+    def _get_method_handler(self, method: str, resource: str) -> Callable:
+        if method not in self.method_handlers:
+            raise RuntimeError("Received method '{}' is invalid. Try: {}".format(
+                method, ", ".join(self.method_handlers)))
+        if resource not in self.method_handlers[method]:
+            raise RuntimeError("Received resource '{}' is invalid for method '{}'. Try: {}".format(
+                resource, method, ", ".join(self.method_handlers[method])))
+        return self.method_handlers[method][resource]
+
     def _run_routines(self):
         self._routines_active = True
         time.sleep(time.time() * 1000 % 1 / 1000)  # enable to sync clock
@@ -198,6 +331,18 @@ class Worker(WorkerABC):
             time.sleep(.001 - time.time() * 1000 % 1 / 1000)
 
 
+def _update_kwargs(kwargs: dict, updates: dict) -> dict:
+    # update a copy of the keyword arguments so that the prepared template stays untouched. nested dictionaries
+    # (like the kwargs of a component execution) are updated rather than replaced.
+    updated = dict(kwargs)
+    for key, value in updates.items():
+        if isinstance(value, dict) and isinstance(updated.get(key, None), dict):
+            updated[key] = dict(updated[key], **value)
+        else:
+            updated[key] = value
+    return updated
+
+
 # Components
 # ~~~~~~~~~~
 class ComponentABC(ABC):
@@ -214,6 +359,9 @@ class PinABC(ComponentABC, ABC):
 
 
 class InputPinABC(PinABC, ABC):
+    # maps the edge type labels (rising, falling, both) to the edge type values used by the platform
+    edge_types: Dict[str, Any] = {}
+
     @abstractmethod
     def value(self) -> bool:
         """Input value."""
@@ -461,6 +609,52 @@ platform_types: Dict[str, type(PlatformABC)] = {}
 
 # Debug platform setup
 # ~~~~~~~~~~~~~~~~~~~~
+class DebugInputPin(InputPinABC):
+    edge_types = {"rising": "rising", "falling": "falling", "both": "both"}
+
+    def __init__(self, pin_id: int, pull=None):
+        super().__init__(pin_id)
+        print("NEW INPUT PIN (id={})".format(pin_id))
+        self._value = False
+        self._event_edge_type = None
+        self._event_callbacks = []
+        self._event_detected = False
+
+    def value(self) -> bool:
+        return self._value
+
+    def set_value(self, is_high: bool) -> None:
+        """ Simulates a signal on the pin. """
+        edge = "rising" if is_high and not self._value else "falling" if self._value and not is_high else None
+        self._value = bool(is_high)
+        print("INPUT PIN SET (id={}, is_high={})".format(self.id, self._value))
+        if edge is not None and self._event_edge_type in (edge, "both"):
+            self._event_detected = True
+            for callback in self._event_callbacks:
+                callback(self.id)
+
+    def wait_for_edge(self, edge_type, timeout: int = None):
+        pass
+
+    def event(self, edge_type, callback: Callable = None, bounce_time: int = None):
+        self._event_edge_type = edge_type
+        self._event_callbacks = [] if callback is None else [callback]
+
+    def remove_event(self):
+        self._event_edge_type = None
+        self._event_callbacks = []
+
+    def event_callback(self, callback: Callable, bounce_time: int = None):
+        self._event_callbacks.append(callback)
+
+    def event_detected(self) -> bool:
+        detected, self._event_detected = self._event_detected, False
+        return detected
+
+    def cleanup(self):
+        print("CLEANED INPUT PIN (id={})".format(self.id))
+
+
 class DebugOutputPin(OutputPinABC):
     def __init__(self, pin_id: int):
         super().__init__(pin_id)
@@ -512,6 +706,7 @@ class DebugPWMPin(PWMPinABC):
 # add the debug platform to the platform stack
 add_platform(
     "debug", {
+        "input": DebugInputPin,
         "output": DebugOutputPin,
         "pwm": DebugPWMPin,
         "servo": make_module_component(ServoComponent, {"pwm": DebugPWMPin})
@@ -531,6 +726,8 @@ try:
 
 
     class RPiInputPin(InputPinABC):
+        edge_types = {"rising": RPi_GPIO.RISING, "falling": RPi_GPIO.FALLING, "both": RPi_GPIO.BOTH}
+
         def __init__(self, pin_id: int, pull=None):
             super().__init__(pin_id)
             if pull is None:
@@ -546,8 +743,9 @@ try:
         def wait_for_edge(self, edge_type, *args, **kwargs):
             RPi_GPIO.wait_for_edge(self.id, edge_type, *args, **kwargs)
 
-        def event(self, edge_type, *args, **kwargs):
-            RPi_GPIO.add_event_detect(self.id, edge_type, *args, **kwargs)
+        def event(self, edge_type, callback: Callable = None, bounce_time: int = None):
+            kwargs = {} if bounce_time is None else {"bouncetime": bounce_time}
+            RPi_GPIO.add_event_detect(self.id, edge_type, callback=callback, **kwargs)
 
         def remove_event(self):
             RPi_GPIO.remove_event_detect(self.id)
@@ -640,3 +838,12 @@ def get_available_platform_component_setup_args(platform_key: str, component_lab
 
 def get_available_platform_component_required_setup_args(platform_key: str, component_label: str) -> set:
     return get_required_args(platform_types[platform_key].component_types[component_label].__init__)
+
+
+def get_capabilities() -> Dict[str, Dict[str, set]]:
+    """ Gets the available platforms mapped to their available components, which are in turn mapped to the required
+    setup arguments of the component.
+    """
+    return {platform_key: {component_label: get_available_platform_component_required_setup_args(
+        platform_key, component_label) - {"self"} for component_label in platform_cls.component_types}
+        for platform_key, platform_cls in platform_types.items()}
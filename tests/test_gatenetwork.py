@@ -0,0 +1,89 @@
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+from mindstone.gatenetwork import GateNetwork
+
+
+def _make_cyclic_network(runs: Counter) -> GateNetwork:
+    def make_procedure(tag):
+        def procedure(gate):
+            runs[tag, gate.feed["k"]] += 1
+            # give the other feeds in flight a chance to interleave with this one
+            time.sleep(0.01)
+            return {"k": gate.feed["k"], "loop": True}
+        return procedure
+
+    network = GateNetwork(max_epochs=5)
+    for tag in ("t0", "t1", "t2"):
+        network.add_gate(tag, make_procedure(tag))
+    network.add_edge("t0", "t1")
+    network.add_edge("t1", "t2")
+    network.add_conditional_edge("t2", "t1", True, "loop")
+    return network
+
+
+def test_stream_cyclic_network_matches_sequential_runs():
+    sequential_runs, streamed_runs = Counter(), Counter()
+    network = _make_cyclic_network(sequential_runs)
+    expected = [network.run("t0", {"k": k}) for k in range(6)]
+    network = _make_cyclic_network(streamed_runs)
+    streamed = []
+    # the epochs of concurrently streamed feeds used to be counted together, so the max epochs were never hit.
+    thread = threading.Thread(
+        target=lambda: streamed.extend(network.stream("t0", ({"k": k} for k in range(6)), max_in_flight=3)),
+        daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive()
+    assert streamed == expected
+    assert streamed_runs == sequential_runs
+    assert sum(count for (tag, _), count in streamed_runs.items() if tag == "t1") == 18
+
+
+def test_incremental_runs_only_rerun_gates_downstream_of_changes():
+    runs = []
+    sensor_values = iter([1, 1, 2])
+
+    def make_procedure(tag, compute):
+        def procedure(gate):
+            runs.append(tag)
+            return compute(gate.feed)
+        return procedure
+
+    network = GateNetwork(client_details={"worker": ("127.0.0.1", 1, "tcp")})
+    network.add_gate("start", make_procedure("start", lambda feed: dict(feed)))
+    # the sensor talks to a worker (without sending any requests here), so it is a source of change
+    network.add_gate("sensor", make_procedure("sensor", lambda feed: {"sensor": next(sensor_values)}), "worker")
+    network.add_gate("offset", make_procedure("offset", lambda feed: {"offset": feed["x"] + 1}))
+    network.add_gate("sum", make_procedure("sum", lambda feed: {"sum": feed["sensor"] + feed["offset"]}))
+    network.add_edge("start", "sensor")
+    network.add_edge("start", "offset")
+    network.add_edge("sensor", "sum")
+    network.add_edge("offset", "sum")
+    results = []
+    for feed in ({"x": 1}, {"x": 1}, {"x": 1}):
+        runs.clear()
+        results.append((network.run("start", feed, incremental=True), sorted(runs)))
+    assert results == [({"sum": {"sum": 3}}, ["offset", "sensor", "start", "sum"]),
+                       ({"sum": {"sum": 3}}, ["sensor", "sum"]),
+                       ({"sum": {"sum": 4}}, ["sensor", "sum"])]
+    runs.clear()
+    sensor_values = iter([2])
+    # a changed starting feed runs the whole network again
+    assert network.run("start", {"x": 2}, incremental=True) == {"sum": {"sum": 5}}
+    assert sorted(runs) == ["offset", "sensor", "start", "sum"]
+
+
+def test_run_batch_stacks_results_that_are_not_dictionaries():
+    network = GateNetwork()
+    network.add_gate("scale", lambda gate: {"x": gate.feed["x"] * 2}, batch_capable=True)
+    network.add_gate("norm", lambda gate: float(abs(gate.feed["x"])))
+    network.add_edge("scale", "norm")
+    x = np.array([3, -1, 2])
+    result = network.run_batch("scale", {"x": x})["norm"]
+    expected = [network.run("scale", {"x": value})["norm"] for value in x]
+    assert list(result.rows) == [0, 1, 2]
+    assert list(result.columns) == expected == [6.0, 2.0, 4.0]
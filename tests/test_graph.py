@@ -0,0 +1,53 @@
+from mindstone import _graph
+
+
+def _make_graph(keys) -> _graph.IndexedGraph:
+    graph = _graph.IndexedGraph()
+    for key in keys:
+        _graph.add_node(graph, key)
+    return graph
+
+
+def test_replacing_a_node_breaks_its_cycles():
+    graph = _make_graph([1, 2])
+    _graph.add_edge(graph, 2, 1)
+    _graph.add_edge(graph, 1, 2)
+    assert not _graph.is_acyclic(graph)
+    _graph.add_node(graph, 2)
+    assert _graph.is_acyclic(graph)
+    assert _graph.get_topological_order(graph) == [1, 2]
+
+
+def test_edges_against_the_order_are_ordered_when_the_order_is_needed():
+    keys = list(range(1000))
+    graph = _make_graph(keys)
+    # add the chain from its sink to its source, so that every edge goes against the order of the nodes
+    for key in reversed(keys[1:]):
+        _graph.add_edge(graph, key, key - 1)
+    assert graph._order is None
+    assert _graph.is_acyclic(graph)
+    assert _graph.get_topological_order(graph) == list(reversed(keys))
+    _graph.add_edge(graph, 0, 999)
+    assert not _graph.is_acyclic(graph)
+    _graph.remove_edge(graph, 0, 999)
+    assert _graph.is_reachable(graph, 999, 0)
+    assert not _graph.is_reachable(graph, 0, 999)
+
+
+def test_reachability_is_searched_from_both_ends():
+    graph = _make_graph(range(6))
+    for from_key, to_key in ((0, 1), (1, 2), (3, 2), (2, 4), (5, 3)):
+        _graph.add_edge(graph, from_key, to_key)
+    # the order is out of date, so both searches run without it
+    assert graph._order is None
+    assert _graph.is_reachable(graph, 0, 4)
+    assert _graph.is_reachable(graph, 5, 4)
+    assert not _graph.is_reachable(graph, 0, 5)
+    assert not _graph.is_reachable(graph, 4, 2)
+    assert _graph.is_acyclic(graph)
+    # the same answers once the graph is ordered again
+    assert graph._order is not None
+    assert _graph.is_reachable(graph, 0, 4)
+    assert _graph.is_reachable(graph, 5, 4)
+    assert not _graph.is_reachable(graph, 0, 5)
+    assert not _graph.is_reachable(graph, 4, 2)
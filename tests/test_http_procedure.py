@@ -0,0 +1,86 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from mindstone.gatenetwork import HTTPRequesProcedure
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # keep connections alive, so that pooled connections can be reused
+    protocol_version = "HTTP/1.1"
+    etag = '"v1"'
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        path = self.path.split("?")[0]
+        if path == "/error":
+            self._send(500, {"error": True})
+        elif self.headers.get("If-None-Match") == self.etag:
+            self._send(304, None, {"Cache-Control": "max-age=0"})
+        else:
+            max_age = 60 if path == "/fresh" else 0
+            self._send(200, {"path": path}, {"ETag": self.etag, "Cache-Control": "max-age={}".format(max_age)})
+
+    def _send(self, status: int, body, headers: dict = None) -> None:
+        self.server.requests.append((self.client_address, status))
+        encoded = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _get_url(server, path: str) -> str:
+    return "http://127.0.0.1:{}{}".format(server.server_address[1], path)
+
+
+def test_requests_share_a_pooled_connection(server):
+    procedure = HTTPRequesProcedure(_get_url(server, "/pooled"))
+    other_procedure = HTTPRequesProcedure(_get_url(server, "/other"))
+    for i in range(5):
+        assert procedure.request({"i": i}) == {"path": "/pooled"}
+        assert other_procedure.request({"i": i}) == {"path": "/other"}
+    assert len(server.requests) == 10
+    assert len({client_address for client_address, _ in server.requests}) == 1
+
+
+def test_fresh_responses_are_served_from_the_cache(server):
+    procedure = HTTPRequesProcedure(_get_url(server, "/fresh"), cache=True)
+    for _ in range(5):
+        assert procedure.request({"a": 1}) == {"path": "/fresh"}
+    assert procedure.request({"a": 2}) == {"path": "/fresh"}
+    assert len(server.requests) == 2
+
+
+def test_expired_responses_are_revalidated_with_their_etag(server):
+    procedure = HTTPRequesProcedure(_get_url(server, "/stale"), cache=True)
+    for _ in range(3):
+        assert procedure.request({"a": 1}) == {"path": "/stale"}
+    # the response expires immediately, so each following request revalidates it
+    assert [status for _, status in server.requests] == [200, 304, 304]
+
+
+def test_error_responses_are_not_cached(server):
+    procedure = HTTPRequesProcedure(_get_url(server, "/error"), cache=True)
+    for _ in range(2):
+        with pytest.raises(requests.HTTPError):
+            procedure.request({"a": 1})
+    assert len(server.requests) == 2
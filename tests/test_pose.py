@@ -0,0 +1,17 @@
+import pytest
+
+from mindstone.pose import PoseMiddleware
+
+
+def test_join_arms_rejects_joints_that_close_a_cycle():
+    pose = PoseMiddleware()
+    tags = list(range(500))
+    # add the arms and joints from the end of the chain, against the order the arms were added in
+    for tag in reversed(tags):
+        pose.add_arm(tag, 1, 0, 0)
+    for tag in reversed(tags[1:]):
+        pose.join_arms(tag - 1, tag)
+    with pytest.raises(RuntimeError):
+        pose.join_arms(tags[-1], tags[0])
+    assert tags[0] not in pose[tags[-1]]
+    assert pose.get_arm_absolute_position(tags[-1]) == (500, 0, 0)